@@ -0,0 +1,187 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Novels stored with an index, so any scene can be read back without scanning the whole text.
+
+An archive is the novel as plain text (`novel.txt`) plus a small binary index next to it
+(`novel.txt.idx`) holding each scene's offset and length in the text along with its delay, word count
+and winner, followed by the winners' names. Scenes can be written in any order (every scene is
+seeded on its own, so a novel can be generated out of order), and scene N's entry is always the Nth.
+Both are memory mapped when read, so pulling out scene N or a run of scenes costs the same however
+long the novel is:
+
+    python archive.py write novel.txt --seed 7 --scenes 350
+    python archive.py read novel.txt 42
+    python archive.py read novel.txt 100 110
+"""
+
+import argparse
+import io
+import mmap
+import struct
+import sys
+
+import saga
+
+MAGIC = b'SAGA'
+VERSION = 2
+HEADER = struct.Struct('<4sHqI')  # Magic, version, master seed, number of scenes (the highest scene number)
+RECORD = struct.Struct('<QIIiIH')  # Offset, length, scene number, delay, words, winner
+# After the records comes the name of each winner, one per line; a winner code is 1 + the line
+# number, and 0 means nobody got away
+
+class ArchiveWriter(object):
+    """Appends scenes to an archive as they're generated"""
+    def write(self, text, scene, delay, winner=None):
+        """Add a scene's text and its index entry. Raises ValueError if the scene is already in the
+        archive (or isn't numbered from 1)."""
+        if scene < 1:
+            raise ValueError("Scenes are numbered from 1, not {}".format(scene))
+        if scene in self.written:
+            raise ValueError("Scene {} is already in the archive".format(scene))
+        data = text.encode('utf-8')
+        code = self.winners.setdefault(winner, len(self.winners) + 1) if winner is not None else 0
+        self.index.seek(HEADER.size + (scene - 1) * RECORD.size)
+        self.index.write(RECORD.pack(self.offset, len(data), scene, delay, len(text.split()), code))
+        self.body.write(data)
+        self.offset += len(data)
+        self.written.add(scene)
+        self.count = max(self.count, scene)
+
+    def close(self):
+        """Add the winners' names, fill in the scene count and close both files. Entries for any
+        scenes that were skipped are left as zeros."""
+        self.index.seek(HEADER.size + self.count * RECORD.size)
+        self.index.write('\n'.join(self.winners).encode('utf-8'))
+        self.index.seek(0)
+        self.index.write(HEADER.pack(MAGIC, VERSION, self.master_seed, self.count))
+        self.index.close()
+        self.body.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __init__(self, path, master_seed):
+        try:
+            header = HEADER.pack(MAGIC, VERSION, master_seed, 0)
+        except struct.error:
+            raise ValueError("The master seed has to fit in 64 bits")
+        self.master_seed = master_seed
+        self.body = open(path, 'wb')
+        self.index = open(path + '.idx', 'wb')
+        self.index.write(header)
+        self.offset = 0
+        self.count = 0
+        self.written = set()  # Scene numbers
+        self.winners = {}  # Name -> code, in the order they first won
+
+class Archive(object):
+    """Random access to the scenes of an archived novel. Scenes are numbered from 1."""
+    def __len__(self):
+        return self.count
+
+    def record(self, scene):
+        """The raw index entry for a scene: (offset, length, scene number, delay, words, winner code)"""
+        record = None
+        if 1 <= scene <= self.count:
+            record = RECORD.unpack_from(self.index, HEADER.size + (scene - 1) * RECORD.size)
+        if record is None or record[2] != scene:  # Past the end, or skipped when it was written
+            raise IndexError("No scene {} in a novel of {} scenes".format(scene, self.count))
+        return record
+
+    def scene(self, scene):
+        """The text of a single scene"""
+        offset, length = self.record(scene)[:2]
+        return self.body[offset:offset + length].decode('utf-8')
+
+    def scenes(self, start, stop):
+        """The text of scenes `start` up to but not including `stop`, in one piece. When they were
+        written in order, that's one slice of the text."""
+        records = [self.record(scene) for scene in range(start, stop)]
+        if not records:
+            return ''
+        if all(a[0] + a[1] == b[0] for a, b in zip(records, records[1:])):
+            return self.body[records[0][0]:records[-1][0] + records[-1][1]].decode('utf-8')
+        return ''.join(self.body[offset:offset + length].decode('utf-8') for offset, length, *rest in records)
+
+    def metadata(self, scene):
+        """What's known about a scene without reading its text"""
+        offset, length, number, delay, words, winner = self.record(scene)
+        return {'scene': number,
+                'seed': saga.scene_seed(self.master_seed, number),
+                'delay': delay,
+                'words': words,
+                'winner': self.winners[winner - 1] if winner else None}
+
+    def close(self):
+        for mapped in (self.index, self.body):
+            if isinstance(mapped, mmap.mmap):  # Not the stand-in for an empty file
+                mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __init__(self, path):
+        self.index = _map(path + '.idx')
+        self.body = _map(path)
+        magic, version, self.master_seed, self.count = HEADER.unpack_from(self.index)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not an index for a SAGA III archive".format(path + '.idx'))
+        names = self.index[HEADER.size + self.count * RECORD.size:]
+        self.winners = bytes(names).decode('utf-8').split('\n') if names else []
+
+def _map(path):
+    """Memory map a whole file read-only. An empty file can't be mapped, but it has nothing to read anyway."""
+    with open(path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return memoryview(b'')
+
+def winner(stage):
+    """Whoever got away at the end of a scene, if anybody did"""
+    for actor in stage.actors:
+        if actor.escaped:
+            return actor.name
+
+def write_novel(path, delay=saga.DEFAULT_SHERIFF_DELAY, master_seed=0, num_scenes=saga.MAX_SCENES):
+    """Generate a novel straight into an archive"""
+    with ArchiveWriter(path, master_seed) as archive:
+        for scene in range(1, num_scenes + 1):
+            out = io.StringIO()
+            stage = saga.init(delay, scene=scene, sink=saga.ScreenplayRenderer(out), rng=saga.scene_rng(master_seed, scene))
+            archive.write(out.getvalue(), scene, delay, winner(stage))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write and read indexed SAGA III novels')
+    commands = parser.add_subparsers(dest='command', required=True)
+    write = commands.add_parser('write', help='generate a novel into an archive')
+    write.add_argument('path')
+    write.add_argument('--delay', type=int, default=saga.DEFAULT_SHERIFF_DELAY, help='arrival time for the SHERIFF')
+    write.add_argument('--seed', type=int, default=0, help='master seed')
+    write.add_argument('--scenes', type=int, default=saga.MAX_SCENES, help='number of scenes')
+    read = commands.add_parser('read', help='print a scene, or a run of scenes, from an archive')
+    read.add_argument('path')
+    read.add_argument('start', type=int, help='first scene')
+    read.add_argument('stop', type=int, nargs='?', help='last scene (default: just the first one)')
+    read.add_argument('--metadata', action='store_true', help='print the index entries instead of the text')
+    args = parser.parse_args()
+
+    if args.command == 'write':
+        try:
+            write_novel(args.path, args.delay, args.seed, args.scenes)
+        except ValueError as e:
+            parser.error(e)
+    else:
+        with Archive(args.path) as archive:
+            stop = args.stop if args.stop is not None else args.start
+            if args.metadata:
+                for scene in range(args.start, stop + 1):
+                    print(archive.metadata(scene))
+            else:
+                sys.stdout.write(archive.scenes(args.start, stop + 1))
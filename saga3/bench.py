@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Throughput benchmarks for scene generation.
+
+Each workload plays a fixed set of seeded scenes, so runs are comparable with each other:
+
+    python bench.py --save baseline.json
+    python bench.py --compare baseline.json
+"""
+
+import argparse
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import saga
+
+SEED = 2015
+REGRESSION_THRESHOLD = 0.10  # Flag anything more than 10% slower than the baseline
+MIN_SECONDS = 0.2  # Short workloads are played over and over for at least this long, so timer noise stays well under the threshold
+
+class Patron(saga.Person):
+    """A bystander who does nothing but wander around the saloon, to fill out a crowd"""
+    __slots__ = ()
+
+    def step(self):
+        self.go_to_random_location()
+        return True
+
+# The saloon with a gang of bandits backing up the robber and a posse of deputies riding in with the sheriff
+POSSE = saga.Scenario(dict(saga.SALOON.description, cast=saga.SALOON.description['cast'] + [
+    {'name': 'bandit {}', 'count': 100, 'class': 'Sheriff', 'delay': True, 'entrance': ['window', 'door'], 'faction': 'outlaws',
+     'props': [("bandit {}'s gun", 'Gun', 'right hand'), ("bandit {}'s holster", 'Holster', 'body')]},
+    {'name': 'deputy {}', 'count': 100, 'class': 'Sheriff', 'delay': True, 'entrance': ['window', 'door'], 'faction': 'law',
+     'props': [("deputy {}'s gun", 'Gun', 'right hand'), ("deputy {}'s holster", 'Holster', 'body')]}]))
+
+# Name -> (number of scenes, sheriff delay, number of patrons, scenario)
+WORKLOADS = {'single scene': (1, saga.DEFAULT_SHERIFF_DELAY, 0, saga.SALOON),
+             'novel': (saga.MAX_SCENES, saga.DEFAULT_SHERIFF_DELAY, 0, saga.SALOON),
+             'long delay': (10, 2000, 0, saga.SALOON),
+             'crowd': (10, saga.DEFAULT_SHERIFF_DELAY, 200, saga.SALOON),
+             'posse': (10, saga.DEFAULT_SHERIFF_DELAY, 0, POSSE)}
+
+def play(num_scenes, delay, patrons, scenario):
+    """Play the seeded scenes of a workload; return their texts and the number of actions taken"""
+    texts = []
+    actions = 0
+    for scene in range(1, num_scenes + 1):
+        out = io.StringIO()
+        stage = scenario.stage(delay, scene, saga.ScreenplayRenderer(out), rng=saga.scene_rng(SEED, scene))
+        table = stage.find('table')
+        for i in range(patrons):
+            Patron(stage, 'patron {}'.format(i + 1)).default_location = table
+        saga.loop(stage)
+        texts.append(out.getvalue())
+        actions += stage.elapsed_time
+    return texts, actions
+
+def measure(name, repeat=3):
+    """Time a workload (best of `repeat`), then run it once more under tracemalloc for peak memory.
+    Each timed run plays the workload as many times as it takes to fill MIN_SECONDS, and counts the
+    average."""
+    workload = WORKLOADS[name]
+    best = None
+    for _ in range(repeat):
+        loops = 0
+        start = time.perf_counter()
+        while True:
+            texts, actions = play(*workload)
+            loops += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_SECONDS:
+                break
+        elapsed /= loops
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    play(*workload)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    words = sum(len(text.split()) for text in texts)
+    return {'seconds': best,
+            'scenes_per_sec': len(texts) / best,
+            'words_per_sec': words / best,
+            'actions_per_sec': actions / best,
+            'usec_per_action': best / actions * 1e6,
+            'peak_memory_kb': peak / 1024,
+            'words': words,
+            'actions': actions}
+
+def compare(results, baseline):
+    """Print the change against a baseline; return the names of workloads that got slower"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['actions_per_sec']
+        change = result['actions_per_sec'] / before - 1
+        print("{:>14}: {:+.1%} actions/sec".format(name, change))
+        if change < -REGRESSION_THRESHOLD:
+            regressions.append(name)
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark SAGA III scene generation')
+    parser.add_argument('--workload', action='append', choices=list(WORKLOADS), help='workload to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per workload; the best one counts')
+    parser.add_argument('--save', metavar='FILE', help='save the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare against a saved JSON baseline')
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.workload or WORKLOADS:
+        result = results[name] = measure(name, args.repeat)
+        print("{:>14}: {scenes_per_sec:9.1f} scenes/s {words_per_sec:11.0f} words/s {actions_per_sec:10.0f} actions/s "
+              "{usec_per_action:7.1f} us/action {peak_memory_kb:9.0f} KB peak".format(name, **result))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'seed': SEED, 'results': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print("Slower than the baseline: {}".format(', '.join(regressions)))
+            sys.exit(1)
@@ -0,0 +1,292 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Compact logs of generated novels, for replaying them exactly without running the simulation again.
+
+For every scene the log keeps each random decision the engine made (initiative rolls, behaviors,
+aiming, hits, which hand to drop from) and the stream of events it produced. Both are stored as
+variable-length integers, with every name written out once and referred to by number after that,
+and every distinct event written out in full only the first time it happens. A scene takes around two
+hundred bytes, against well over a kilobyte of text. A log can be played back two ways:
+
+    python replay.py record novel.log --seed 7 --scenes 350
+    python replay.py render novel.log     # Re-render the recorded events, no simulation at all
+    python replay.py verify novel.log     # Re-run the engine on the recorded decisions and check it agrees
+"""
+
+import argparse
+import io
+import sys
+
+import saga
+
+MAGIC = b'SAGL'
+VERSION = 1
+
+class RecordingRandom(object):
+    """Stands in for a scene's random number generator, noting down every decision it hands out"""
+    def randrange(self, start, stop=None):
+        value = self.rng.randrange(start, stop)
+        _write_varint(self.decisions, value - (start if stop is not None else 0))
+        return value
+
+    def randint(self, a, b):
+        value = self.rng.randint(a, b)
+        _write_varint(self.decisions, value - a)
+        return value
+
+    def choice(self, seq):
+        index = self.rng.randrange(len(seq))
+        _write_varint(self.decisions, index)
+        return seq[index]
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.decisions = bytearray()
+
+class ReplayRandom(object):
+    """Hands the recorded decisions back out, in the same order"""
+    def next(self):
+        value, self.pos = _read_varint(self.decisions, self.pos)
+        return value
+
+    def randrange(self, start, stop=None):
+        return self.next() + (start if stop is not None else 0)
+
+    def randint(self, a, b):
+        return self.next() + a
+
+    def choice(self, seq):
+        return seq[self.next()]
+
+    def __init__(self, decisions):
+        self.decisions = decisions
+        self.pos = 0
+
+class Recorder(object):
+    """A sink that encodes every event before passing it on to another sink"""
+    def emit(self, event):
+        self.events += 1
+        self.log.write_event(event, self.encoded)
+        self.sink.emit(event)
+
+    def flush(self):
+        self.sink.flush()
+
+    def __init__(self, log, sink):
+        self.log = log
+        self.sink = sink
+        self.encoded = bytearray()
+        self.events = 0
+
+class LogWriter(object):
+    """Writes scenes to a log, keeping the table of names that have been written out so far"""
+    def record_scene(self, delay, scene, master_seed, renderer=saga.ScreenplayRenderer):
+        """Play a scene, logging it as it goes, and return its rendered text"""
+        out = io.StringIO()
+        rng = RecordingRandom(saga.scene_rng(master_seed, scene))
+        recorder = Recorder(self, renderer(out))
+        saga.init(delay, scene=scene, sink=recorder, rng=rng)
+        record = bytearray()
+        for n in (scene, delay, len(rng.decisions)):
+            _write_varint(record, n)
+        record += rng.decisions
+        _write_varint(record, recorder.events)
+        record += recorder.encoded
+        self.out.write(record)
+        return out.getvalue()
+
+    def write_event(self, event, out):
+        """Write an event as its number. The same few events come up again and again, so only the
+        first time an event happens is it spelled out (right after its number)."""
+        index = self.events.get(event)
+        if index is not None:
+            _write_varint(out, index)
+            return
+        index = self.events[event] = len(self.events)
+        _write_varint(out, index)
+        _write_varint(out, VERBS.index(event.verb))
+        self.write_name(event.actor, out)
+        _write_varint(out, len(event.objects))
+        for obj in event.objects:
+            if isinstance(obj, int):
+                _write_varint(out, obj * 2 + 1)
+            else:
+                self.write_name(obj, out, tag=2)
+        self.write_name(event.outcome, out)
+
+    def write_name(self, name, out, tag=1):
+        """Write a name as its number plus one (0 is None), times `tag`. A name that hasn't been seen
+        before gets the next number, and is spelled out right after it."""
+        if name is None:
+            _write_varint(out, 0)
+            return
+        index = self.names.get(name)
+        if index is not None:
+            _write_varint(out, (index + 1) * tag)
+            return
+        index = self.names[name] = len(self.names)
+        _write_varint(out, (index + 1) * tag)
+        data = name.encode('utf-8')
+        _write_varint(out, len(data))
+        out += data
+
+    def close(self):
+        self.out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __init__(self, path):
+        self.out = open(path, 'wb')
+        self.out.write(MAGIC + bytes((VERSION,)))
+        self.names = {}  # Name -> its number in the log
+        self.events = {}  # Event -> its number in the log
+
+class LogReader(object):
+    """Reads the scenes back out of a log, one at a time"""
+    def __iter__(self):
+        """Yield (scene, delay, decisions, events) for each scene, where `events` is a list of event
+        numbers; `self.events` has the Event for each number"""
+        data = self.data
+        pos = len(MAGIC) + 1
+        while pos < len(data):
+            scene, pos = _read_varint(data, pos)
+            delay, pos = _read_varint(data, pos)
+            size, pos = _read_varint(data, pos)
+            decisions = data[pos:pos + size]
+            pos += size
+            count, pos = _read_varint(data, pos)
+            events = []
+            for _ in range(count):
+                index, pos = _read_varint(data, pos)
+                if index == len(self.events):
+                    event, pos = self.read_event(pos)
+                    self.events.append(event)
+                events.append(index)
+            yield scene, delay, decisions, events
+
+    def read_event(self, pos):
+        """Read the definition of an event the first time it comes up"""
+        data = self.data
+        verb, pos = _read_varint(data, pos)
+        actor, pos = self.read_name(pos)
+        count, pos = _read_varint(data, pos)
+        objects = []
+        for _ in range(count):
+            value, pos = _read_varint(data, pos)
+            if value & 1:
+                objects.append(value >> 1)
+            else:
+                obj, pos = self.read_name(pos, value >> 1)
+                objects.append(obj)
+        outcome, pos = self.read_name(pos)
+        return saga.Event(VERBS[verb], actor, tuple(objects), outcome), pos
+
+    def read_name(self, pos, number=None):
+        """Read a name written by LogWriter.write_name. `number` is given if it's already been read."""
+        if number is None:
+            number, pos = _read_varint(self.data, pos)
+        if number == 0:
+            return None, pos
+        if number > len(self.names):
+            size, pos = _read_varint(self.data, pos)
+            self.names.append(self.data[pos:pos + size].decode('utf-8'))
+            pos += size
+        return self.names[number - 1], pos
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        if self.data[:len(MAGIC)] != MAGIC or self.data[len(MAGIC)] != VERSION:
+            raise ValueError("{} is not a SAGA III log".format(path))
+        self.names = []
+        self.events = []
+
+VERBS = tuple(sorted(saga.SCREENPLAY)) + ('shot',)  # Verbs by their number in the log
+
+def _write_varint(out, n):
+    """Append a non-negative integer, seven bits to a byte"""
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _read_varint(data, pos):
+    """Read an integer written by _write_varint; returns it and the position after it"""
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+def record(path, delay=saga.DEFAULT_SHERIFF_DELAY, master_seed=0, num_scenes=saga.MAX_SCENES,
+           renderer=saga.ScreenplayRenderer):
+    """Generate a novel into a log, yielding the text of each scene as it goes"""
+    with LogWriter(path) as log:
+        for scene in range(1, num_scenes + 1):
+            yield log.record_scene(delay, scene, master_seed, renderer)
+
+def render(path, renderer=saga.ScreenplayRenderer):
+    """Yield the text of each scene in a log from the recorded events alone. Each distinct event is
+    only rendered once, unless the renderer lays events out in context (like the teleplay)."""
+    log = LogReader(path)
+    if renderer.emit is not saga.Renderer.emit:
+        for scene, delay, decisions, events in log:
+            out = io.StringIO()
+            sink = renderer(out)
+            for event in events:
+                sink.emit(log.events[event])
+            sink.flush()
+            yield out.getvalue()
+        return
+    sink = renderer(None)
+    texts = []  # Event number -> its text
+    for scene, delay, decisions, events in log:
+        while len(texts) < len(log.events):
+            texts.append(sink.render(log.events[len(texts)]))
+        yield ''.join([texts[event] for event in events])
+
+def rerun(path, renderer=saga.ScreenplayRenderer):
+    """Yield the text of each scene in a log by running the engine again, on the recorded decisions"""
+    for scene, delay, decisions, events in LogReader(path):
+        out = io.StringIO()
+        saga.init(delay, scene=scene, sink=renderer(out), rng=ReplayRandom(decisions))
+        yield out.getvalue()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record and replay SAGA III novels')
+    commands = parser.add_subparsers(dest='command', required=True)
+    write = commands.add_parser('record', help='generate a novel, logging it as it goes')
+    write.add_argument('path')
+    write.add_argument('--delay', type=int, default=saga.DEFAULT_SHERIFF_DELAY, help='arrival time for the SHERIFF')
+    write.add_argument('--seed', type=int, default=0, help='master seed')
+    write.add_argument('--scenes', type=int, default=saga.MAX_SCENES, help='number of scenes')
+    for command, help in (('render', 'print a logged novel from its recorded events'),
+                          ('rerun', 'print a logged novel by running the engine on its recorded decisions'),
+                          ('verify', 'check that the engine still tells the logged story')):
+        commands.add_parser(command, help=help).add_argument('path')
+    args = parser.parse_args()
+
+    out = saga.Renderer(sys.stdout)
+    if args.command == 'record':
+        for text in record(args.path, args.delay, args.seed, args.scenes):
+            out.write(text)
+    elif args.command == 'render':
+        for text in render(args.path):
+            out.write(text)
+    elif args.command == 'rerun':
+        for text in rerun(args.path):
+            out.write(text)
+    else:
+        for scene, (recorded, rerun_text) in enumerate(zip(render(args.path), rerun(args.path)), 1):
+            if recorded != rerun_text:
+                print("Scene {} plays out differently".format(scene))
+                sys.exit(1)
+        print("OK")
+    out.flush()
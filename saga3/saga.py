@@ -1,9 +1,20 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-import inspect
+import argparse
+import bisect
+import collections
+import functools
+import heapq
+import itertools
+import io
+import json
 import logging
+import multiprocessing
 import random
+import sys
+import time
+import types
 
 log = logging.getLogger()
 
@@ -11,6 +22,17 @@ DEFAULT_SHERIFF_DELAY = 20
 DEFAULT_NUM_BULLETS = 5
 DEFAULT_HEALTH = 5
 MAX_SCENES = 350  # ~150 words per scene
+NANOGENMO_WORDS = 50000
+MAX_STEPS = 10000  # Per-scene step budget, on top of the sheriff's delay
+BATCH_SIZE = 16  # Scenes sent to a worker at a time; one alone is too quick to be worth the round trip
+DOOR_COST = 2  # Extra turns it takes to get through a door: opening it, and closing it behind you
+TELEPLAY_WIDTH = 70  # Columns the published teleplay is centered in
+MAX_RETRIES = 100  # How many no-op behaviors an actor may pick in a row before giving up the turn
+
+RETRY = object()  # Returned by Person.step when the actor didn't actually do anything
+
+# The objects people's behaviors refer to, by what they do -> the name of the object in the scenario
+HANDLES = {'gun': 'gun', 'glass': 'glass', 'bottle': 'bottle', 'money': 'money', 'window': 'window'}
 
 # Initiatives
 HIGH_INITIATIVE = 30
@@ -24,65 +46,696 @@ GUN_DAMAGE = {'miss': {'health': 0,
               'hit': {'health': -2,
                       'message': '{} HIT'}}
 
-class Stage(object):
-    """The world model"""
-    elapsed_time = 0
-    current_scene = 0
+class WeightedSampler(object):
+    """Picks values in proportion to their integer weights. The cumulative weights are worked out
+    once, so a draw is one random number and a bisect. A draw consumes the same random number as
+    random.choice() over the weights expanded into a list, so it makes the same picks."""
+    def choose(self, rng):
+        return self.values[bisect.bisect_right(self.cumulative, rng.randrange(self.total))]
+
+    def __init__(self, weighted_choices):
+        self.values = []
+        self.cumulative = []
+        self.total = 0
+        for val, cnt in weighted_choices:
+            if cnt > 0:
+                self.total += cnt
+                self.values.append(val)
+                self.cumulative.append(self.total)
+
+@functools.lru_cache(maxsize=None)
+def sampler(weighted_choices):
+    """A shared sampler for a tuple of (value, weight) pairs"""
+    return WeightedSampler(weighted_choices)
+
+@functools.lru_cache(maxsize=None)
+def hit_sampler(hit_weight):
+    """How likely a shot is to miss, nick or hit, for a given hit weight"""
+    return sampler((('miss', 3), ('nick', 3 * hit_weight), ('hit', 1 * hit_weight)))
+
+BEHAVIORS = sampler((('drink', 5), ('wander', 3), ('check', 1), ('lean', 1), ('count', 1), ('drop', 1)))
+
+Event = collections.namedtuple('Event', ['verb', 'actor', 'objects', 'outcome'])
+Event.__doc__ = """Something that happened in the world: who did what to which objects (by name), and how it turned out"""
+
+# How each verb reads in the screenplay; `objects` fill the positional fields
+SCREENPLAY = {'scene': "\nAct 1 Scene {0}\n\n\n",
+              'status': "{0}. ",
+              'begin': "\n",
+              'turn': "\n{0}\n",
+              'curtain': "CURTAIN\n",
+              'arrive': "(The {0} is at the {1}.)\n",
+              'open': "open {0}\n",
+              'close': "close {0}\n",
+              'go': "go to {0}\n",
+              'go through': "go through {0}\n",
+              'take': "pick up the {0} with the {1}\n",
+              'drop': "put {0} {1} {2}\n",
+              'aim': "aim\n",
+              'fire': "fire\n",
+              'dies': "{0} dies.\n",
+              'blow out': "blow out barrel\n",
+              'check': "check gun\n",
+              'count': "count {0}\n",
+              'lean': "lean on {0} and look\n",
+              'pour': "pour\n",
+              'drink': "take a drink from {0}\n"}
+
+class Renderer(object):
+    """A sink for the event stream. Rendered text is collected and written out in large batches
+    rather than a write per fragment."""
+    buffer_size = 64 * 1024
+
+    def render(self, event):
+        """Return the text for a single event"""
+        raise NotImplementedError
+
+    def emit(self, event):
+        self.write(self.render(event))
+
+    def write(self, text):
+        """Buffer some text, writing it out once enough has piled up"""
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write out everything buffered so far"""
+        self.out.write(''.join(self.buffer))
+        self.buffer = []
+        self.buffered = 0
+
+    def __init__(self, out=None):
+        self.out = out if out is not None else sys.stdout
+        self.buffer = []
+        self.buffered = 0
+
+def screenplay(event):
+    """The screenplay text for a single event"""
+    if event.verb == 'shot':
+        return GUN_DAMAGE[event.outcome]['message'].format(*event.objects) + "\n"
+    if event.verb == 'status':
+        return SCREENPLAY['status'].format("the {} is {} the {}".format(*event.objects).capitalize())
+    if event.verb == 'turn':
+        return SCREENPLAY['turn'].format(event.actor.upper())
+    return SCREENPLAY[event.verb].format(*event.objects)
+
+class ScreenplayRenderer(Renderer):
+    """The plain screenplay text: scene headings, actor names and one stage direction per line"""
+    def render(self, event):
+        return screenplay(event)
+
+@functools.lru_cache(maxsize=4096)
+def layout(text, width=TELEPLAY_WIDTH):
+    """Word-wrap a paragraph and center each line, the way the teleplay is printed. Actor names and
+    a lot of short turns ("Aim; fire; MISSED") come up over and over, so layouts are cached."""
+    lines = []
+    line = ''
+    for word in text.split():
+        if not line:
+            line = word
+        elif len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line += ' ' + word
+    lines.append(line)
+    return ''.join(line.center(width).rstrip() + "\n" for line in lines)
+
+class TeleplayRenderer(ScreenplayRenderer):
+    """The screenplay laid out ready to publish: actor names centered, and each turn's stage directions
+    run together into sentences ("Aim; fire; robber HIT"), word-wrapped and centered. A turn is laid
+    out as soon as the next one starts."""
+    def emit(self, event):
+        verb = event.verb
+        if verb == 'scene':
+            self.write("\n" + layout("Act 1 Scene {}".format(*event.objects)) + "\n\n")
+        elif verb == 'begin':
+            self.end_turn()
+        elif verb == 'turn':
+            self.end_turn()
+            self.write("\n" + layout(event.actor.upper()))
+        elif verb == 'curtain':
+            self.end_turn()
+            self.write("\n" + layout("CURTAIN"))
+        elif verb in ('status', 'arrive', 'dies'):  # Sentences of their own
+            self.end_sentence()
+            self.sentences.append(_capitalize(self.render(event).strip()))
+        else:
+            self.phrases.append(self.render(event).strip())
+
+    def end_sentence(self):
+        """Run the directions so far together into one sentence"""
+        if self.phrases:
+            self.sentences.append(_capitalize('; '.join(self.phrases)))
+            self.phrases = []
+
+    def end_turn(self):
+        """Lay out everything since the last turn started"""
+        self.end_sentence()
+        if self.sentences:
+            self.write(layout(' '.join(self.sentences)))
+            self.sentences = []
+
+    def __init__(self, out=None):
+        super(TeleplayRenderer, self).__init__(out)
+        self.sentences = []  # Finished sentences in the current turn
+        self.phrases = []  # Directions in the current sentence
+
+def _capitalize(text):
+    """Uppercase the first letter only (str.capitalize would lowercase 'NICKED')"""
+    return text[:1].upper() + text[1:]
+
+class JSONRenderer(Renderer):
+    """One JSON object per event, per line"""
+    def render(self, event):
+        return json.dumps(event._asdict()) + "\n"
+
+class NullRenderer(object):
+    """Throws every event away, for running the simulation headless"""
+    def emit(self, event):
+        pass
+
+    def flush(self):
+        pass
+
+    def __init__(self, out=None):
+        pass
+
+@functools.lru_cache(maxsize=4096)
+def screenplay_words(event):
+    """How many words an event comes to in the screenplay. Most events are the same few directions
+    over and over, so counts are cached."""
+    return len(screenplay(event).split())
+
+class WordCounter(object):
+    """Passes events on to another sink, keeping count of how many words they come to in the
+    screenplay, so the length of a novel doesn't depend on the format it's written out in"""
+    def emit(self, event):
+        self.words += screenplay_words(event)
+        self.sink.emit(event)
+
+    def flush(self):
+        self.sink.flush()
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.words = 0
+
+RENDERERS = {'screenplay': ScreenplayRenderer,
+             'teleplay': TeleplayRenderer,
+             'json': JSONRenderer,
+             'none': NullRenderer}
+
+class Metrics(object):
+    """Opt-in counters and timings for the simulation: how often each decision branch was taken and
+    how long it took, plus per-scene totals. A Stage without metrics pays nothing for them."""
+    def record(self, branch, seconds):
+        """Count one pass through a decision branch"""
+        self.counts[branch] = self.counts.get(branch, 0) + 1
+        self.seconds[branch] = self.seconds.get(branch, 0) + seconds
+
+    def count(self, counter, n=1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def end_scene(self, stage):
+        """Fold in the totals for a finished scene"""
+        self.count('scenes')
+        self.count('steps', stage.elapsed_time)
+        self.count('initiative evaluations', stage.initiative.evaluations)
+
+    def snapshot(self):
+        """Everything recorded so far, as a plain dict"""
+        return {'branches': {branch: {'count': self.counts[branch], 'seconds': self.seconds[branch]}
+                             for branch in sorted(self.counts)},
+                'counters': dict(sorted(self.counters.items()))}
+
+    def merge(self, snapshot):
+        """Add in a snapshot taken elsewhere (another scene, another process)"""
+        for branch, stats in snapshot['branches'].items():
+            self.counts[branch] = self.counts.get(branch, 0) + stats['count']
+            self.seconds[branch] = self.seconds.get(branch, 0) + stats['seconds']
+        for counter, n in snapshot['counters'].items():
+            self.count(counter, n)
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
 
-    @property
-    def actors(self):
-        """Returns all the objects in the world that are people"""
-        return [obj for obj in self.objects if hasattr(obj, 'body')]
+    def __init__(self):
+        self.counts = {}  # Branch -> number of times taken
+        self.seconds = {}  # Branch -> total time spent in it
+        self.counters = {}
+
+class InitiativeQueue(object):
+    """Decides who moves next. Actors sit in a heap keyed on their initiative, and an actor's
+    initiative is only worked out again once something about them has changed (see `touch`), so
+    each step costs O(log n) in the number of actors rather than asking everybody. Ties go to
+    whoever joined the scene first.
+
+    Initiative has a random roll in it, and a low roll mustn't shut an actor out for the rest of
+    the scene, so every roll also runs out after as many steps as there are actors. On average that's
+    one roll drawn again per step, however big the cast."""
+    def add(self, actor):
+        self.order[actor] = len(self.order)
+        self.touch(actor)
+
+    def touch(self, actor):
+        """The actor's state changed, so their initiative needs working out again"""
+        self.dirty[actor] = None
+
+    def touch_all(self):
+        """Something changed that everybody cares about (like a death)"""
+        for actor in self.order:
+            self.dirty[actor] = None
+
+    def wake_at(self, time, actor):
+        """Reconsider the actor once the clock reaches `time`, for state that changes with time alone"""
+        heapq.heappush(self.alarms, (time, self.order[actor], actor))
+
+    def next_actor(self, now):
+        """The actor with the highest initiative right now"""
+        while self.alarms and self.alarms[0][0] <= now:
+            self.touch(heapq.heappop(self.alarms)[2])
+        while self.expiries and self.expiries[0][0] <= now:
+            time, entry, actor = heapq.heappop(self.expiries)
+            if self.entries[actor] == entry:  # Still the roll they're sitting on
+                self.touch(actor)
+        self.evaluations += len(self.dirty)
+        lifetime = len(self.order)
+        for actor in self.dirty:
+            self.counter += 1
+            self.entries[actor] = self.counter  # Any older entry for this actor is now stale
+            heapq.heappush(self.heap, (-actor.initiative(), self.order[actor], self.counter, actor))
+            heapq.heappush(self.expiries, (now + lifetime, self.counter, actor))
+        self.dirty.clear()
+        if len(self.heap) > 2 * len(self.entries) + 32:  # Mostly stale entries, so sweep them out
+            self.heap = [entry for entry in self.heap if self.entries[entry[3]] == entry[2]]
+            heapq.heapify(self.heap)
+        while self.entries[self.heap[0][3]] != self.heap[0][2]:
+            heapq.heappop(self.heap)
+        return self.heap[0][3]
+
+    def copy(self, objects):
+        """A copy of the queue for a forked stage, with actors swapped for their counterparts in `objects`"""
+        clone = InitiativeQueue()
+        clone.heap = [(initiative, order, entry, objects[actor]) for initiative, order, entry, actor in self.heap]
+        clone.entries = {objects[actor]: entry for actor, entry in self.entries.items()}
+        clone.order = {objects[actor]: order for actor, order in self.order.items()}
+        clone.dirty = {objects[actor]: None for actor in self.dirty}
+        clone.alarms = [(time, order, objects[actor]) for time, order, actor in self.alarms]
+        clone.expiries = [(time, entry, objects[actor]) for time, entry, actor in self.expiries]
+        clone.counter = self.counter
+        clone.evaluations = self.evaluations
+        return clone
+
+    def __init__(self):
+        self.heap = []  # (-initiative, order, entry number, actor)
+        self.entries = {}  # Actor -> the number of their live heap entry
+        self.order = {}  # Actor -> the order they joined the scene in
+        self.dirty = {}  # Ordered set of actors to reconsider
+        self.alarms = []  # (time, order, actor)
+        self.expiries = []  # (time, entry number, actor): when each roll runs out
+        self.counter = 0
+        self.evaluations = 0  # How many times anybody's initiative was worked out
+
+class Routes(object):
+    """Shortest routes around a set, worked out once and shared by every scene played on it. Places
+    are joined by connections; a set with no connections at all is one big room, where every place
+    can be reached directly from every other. Tables are kept by place name, so copies of a stage
+    can share them."""
+    def next_hop(self, stage, origin, destination):
+        """Where to go next on the way from `origin` to `destination`. Arriving from offstage, or
+        heading somewhere that isn't on the map (like a table-top or somebody's hand), goes straight
+        there."""
+        if origin is None:
+            return destination
+        hop = self.hops.get(origin.name, {}).get(destination.name)
+        return destination if hop is None else stage.find(hop)
+
+    def room(self, place):
+        """Who can see whom: people in the same room can. In one big room that's everybody on stage;
+        on a map of connected places, it's whoever is at the same place."""
+        return place.name if self.hops and place is not None else None
+
+    def __init__(self, places=(), connections=None):
+        self.hops = {}  # Place name -> destination name -> name of the next place on the way
+        if connections is None:
+            return
+        neighbours = {place.name: [] for place in places}
+        costs = {place.name: 1 + (DOOR_COST if place.is_openable else 0) for place in places}
+        for a, b in connections:
+            neighbours[a].append(b)
+            neighbours[b].append(a)
+        for origin in neighbours:
+            hops = self.hops[origin] = {}
+            distances = {origin: 0}  # Cost of getting to each place worked out so far
+            frontier = [(costs[place], place, place) for place in neighbours[origin]]
+            heapq.heapify(frontier)
+            while frontier:
+                distance, place, first = heapq.heappop(frontier)
+                if place in distances:
+                    continue
+                distances[place] = distance
+                hops[place] = first
+                for neighbour in neighbours[place]:
+                    if neighbour not in distances:
+                        heapq.heappush(frontier, (distance + costs[neighbour], neighbour, first))
+
+ONE_ROOM = Routes()
+
+class Stage(object):
+    """The world model. Every object belongs to exactly one Stage, so any number of scenes can be
+    built and run side by side. (Fixtures are the exception: they never change, so copies of a stage
+    share them.)
+
+    The name and owner indexes hold positions in `objects` and `actors`, which are the same on every
+    copy of a stage, so copies share them too until one of them adds something."""
+
+    def add_actor(self, actor):
+        """Register a Person, and their body parts, with the world and its initiative queue"""
+        self.own_indexes()
+        for part in actor.parts:
+            self.owners[part] = len(self.actors)
+        self.actors.append(actor)
+        self.initiative.add(actor)
+
+    def own_indexes(self):
+        """Take a private copy of indexes shared with another copy of the stage, before changing them"""
+        if self.borrowed:
+            self.names = dict(self.names)
+            self.owners = dict(self.owners)
+            self.borrowed = False
+
+    def touch(self, actor):
+        """Mark an actor whose initiative may have changed"""
+        self.initiative.touch(actor)
 
     def find(self, obj_name):
         """Find an object by name in the world and return the object"""
-        return next(obj for obj in self.objects + self.places if obj.name == obj_name)
-
-    def __init__(self):
+        return self.objects[self.names[obj_name]]
+
+    def get(self, obj_name):
+        """The object with a name, or None if there isn't one"""
+        index = self.names.get(obj_name)
+        return None if index is None else self.objects[index]
+
+    def owner(self, part):
+        """Whoever a body part belongs to, or None if it isn't one"""
+        index = self.owners.get(part)
+        return None if index is None else self.actors[index]
+
+    def add(self, obj):
+        """Register a new object with the world. If two objects share a name (like a Person and
+        their body) the first one registered wins, same as a scan of the objects list would."""
+        self.own_indexes()
+        self.names.setdefault(obj.name, len(self.objects))
+        self.objects.append(obj)
+
+    def relocate(self, obj, old_location, new_location):
+        """Keep the location index, and the held items of whoever's hands are involved, in step
+        with an object that moved"""
+        if old_location is not None:
+            contents = self.contents[old_location]
+            contents.remove(obj)
+            if not contents:
+                del self.contents[old_location]
+            owner = self.owner(old_location)
+            if owner is not None:
+                owner.release(obj)
+        if new_location is not None:
+            self.contents.setdefault(new_location, []).append(obj)
+            owner = self.owner(new_location)
+            if owner is not None:
+                owner.hold(obj)
+        if isinstance(obj, Person) and obj.faction is not None and obj.is_alive:
+            if old_location is not None:
+                del self.occupants[self.routes.room(old_location)][obj.faction][obj]
+            if new_location is not None:
+                self.occupants.setdefault(self.routes.room(new_location), {}).setdefault(obj.faction, {})[obj] = None
+
+    def enlist(self, actor):
+        """Count a newly-sided actor among the living members of their faction"""
+        self.living[actor.faction] = self.living.get(actor.faction, 0) + 1
+        if actor.location is not None:
+            self.occupants.setdefault(self.routes.room(actor.location), {}).setdefault(actor.faction, {})[actor] = None
+
+    def casualty(self, actor):
+        """Take somebody who's just been killed out of the fighting. Returns True if that was the
+        last of their faction."""
+        if actor.faction is None:
+            return False
+        if actor.location is not None:
+            del self.occupants[self.routes.room(actor.location)][actor.faction][actor]
+        self.living[actor.faction] -= 1
+        return self.living[actor.faction] == 0
+
+    def hostile_to(self, actor):
+        """The first hostile to arrive in the same room as `actor` who's still alive, or None. Costs
+        one look per faction in the room, however many people are in it."""
+        if actor.faction is None:
+            return None
+        for faction, members in self.occupants.get(self.routes.room(actor.location), {}).items():
+            if faction != actor.faction:
+                for member in members:
+                    return member
+
+    def hostiles_alive(self, actor):
+        """Is anybody on another side still alive, anywhere?"""
+        return any(count for faction, count in self.living.items() if faction != actor.faction)
+
+    def emit(self, verb, *objects, outcome=None):
+        """Report something that happened to whoever is listening"""
+        self.sink.emit(Event(verb, self.actor.name if self.actor else None, objects, outcome))
+
+    def contents_of(self, location):
+        """Everything currently at a location (or in a hand), in the order it arrived"""
+        return self.contents.get(location, ())
+
+    def fork(self, sink=None, metrics=None, rng=None):
+        """A copy of the stage that plays on independently of this one. Each object's own state is
+        copied, and anything that pointed at an object on this stage (locations, enemies, paths,
+        queued commands) points at its counterpart on the copy. Fixtures (places, body parts,
+        holsters), strings and numbers are shared, and so are the name and owner indexes. Unless
+        it's given a new `rng`, the copy's picks up from the same state as this one's."""
+        if rng is None:
+            rng = random.Random()
+            rng.setstate(self.rng.getstate())
+        self.share_fixtures()
+        clone = Stage(self.current_scene, sink, self.max_steps, metrics, rng)
+        objects = {obj: obj if obj.is_fixture else _blank(obj) for obj in self.objects}
+        objects[self] = clone
+        for obj in self.objects:
+            if not obj.is_fixture:
+                _copy_state(obj, objects[obj], objects)
+        return self._rewire(clone, objects)
+
+    def share_fixtures(self):
+        """Let go of the fixtures, which are about to be shared with copies of the stage"""
+        for obj in self.objects:
+            if obj.is_fixture:
+                obj.stage = None
+
+    def _rewire(self, clone, objects):
+        """Fill in a copy's own bookkeeping, given the copies of all this stage's objects"""
+        clone.objects = [objects[obj] for obj in self.objects]
+        clone.places = [objects[place] for place in self.places]
+        clone.actors = [objects[actor] for actor in self.actors]
+        clone.names = self.names
+        clone.owners = self.owners
+        self.borrowed = clone.borrowed = True
+        clone.contents = {objects[location]: [objects[obj] for obj in contents]
+                          for location, contents in self.contents.items()}
+        clone.initiative = self.initiative.copy(objects)
+        clone.actor = objects.get(self.actor)
+        clone.next_actor = objects.get(self.next_actor)
+        clone.elapsed_time = self.elapsed_time
+        clone.finished = self.finished
+        clone.routes = self.routes
+        clone.handles = self.handles
+        clone.occupants = {room: {faction: {objects[actor]: None for actor in members}
+                                  for faction, members in factions.items()}
+                           for room, factions in self.occupants.items()}
+        clone.living = dict(self.living)
+        return clone
+
+    def snapshot(self):
+        """Freeze the scene as it stands, to fork alternate continuations from"""
+        return Snapshot(self)
+
+    def __init__(self, scene=1, sink=None, max_steps=MAX_STEPS, metrics=None, rng=None):
+        self.current_scene = scene
+        self.rng = rng if rng is not None else random.Random()  # Every random decision in the scene comes from here
+        self.max_steps = max_steps
+        self.metrics = metrics
+        self.sink = sink if sink is not None else NullRenderer()
+        self.actor = None  # Whoever has the floor
+        self.next_actor = None  # Whoever gets the floor at the next turn
+        self.elapsed_time = 0
+        self.finished = False  # Whether the curtain has come down
         self.objects = []
         self.places = []
+        self.routes = ONE_ROOM
+        self.handles = HANDLES  # What people's behaviors call the props they use -> their names here
+        self.actors = []  # The people, in the order they joined the scene
+        self.initiative = InitiativeQueue()
+        self.names = {}  # Name -> where the object is in `objects`
+        self.contents = {}  # Location -> the objects in it, in the order they arrived (no entry if it's empty)
+        self.owners = {}  # Body part -> where the Person it belongs to is in `actors`
+        self.borrowed = False  # Whether `names` and `owners` are shared with another copy of the stage
+        self.occupants = {}  # Room -> faction -> ordered set of the living people in it
+        self.living = {}  # Faction -> how many of them are still alive
+
+class Snapshot(object):
+    """A Stage frozen part way through a scene, random number generator and all. Every fork starts
+    from the same frozen copy, so exploring a thousand branches never means playing the scene up to
+    the branch point again. The frozen copy is compiled into a Template, so each fork costs about
+    as much as stamping out a fresh scene."""
+    def fork(self, sink=None, metrics=None, seed=None):
+        """A fresh stage to carry on from the snapshot. With no `seed` it plays on exactly as the
+        original would have; with one, the dice fall differently from here on."""
+        rng = random.Random()
+        if seed is None:
+            rng.setstate(self.rng_state)
+        else:
+            rng.seed(seed)
+        return self.template.stage(self.stage.current_scene, sink, metrics, rng)
+
+    def __init__(self, stage):
+        self.stage = stage.fork()
+        self.rng_state = stage.rng.getstate()
+        self.template = Template(self.stage)
+
+class Template(object):
+    """A Stage compiled down to what it takes to copy it: the class of each object, and its state
+    sorted into values that can be shared as they are, references to other objects on the stage, and
+    anything else (paths, queues) that needs copying properly. Fixtures aren't copied at all. Stamping
+    out a stage from a template is much cheaper than building one up object by object."""
+    def stage(self, scene=1, sink=None, metrics=None, rng=None):
+        """A fresh copy of the template's stage"""
+        original = self.original
+        clone = Stage(scene, sink, original.max_steps, metrics, rng)
+        copies = [cls.__new__(cls) if fixture is None else fixture for cls, fixture in zip(self.classes, self.fixtures)]
+        objects = dict(zip(original.objects, copies))
+        objects[original] = clone
+        for obj, shared, references, others in zip(copies, self.shared, self.references, self.others):
+            for name, value in shared:
+                setattr(obj, name, value)
+            for name, index in references:
+                setattr(obj, name, clone if index is None else copies[index])
+            for name, value in others:
+                setattr(obj, name, _counterpart(value, objects))
+        return original._rewire(clone, objects)
+
+    def __init__(self, stage):
+        stage.share_fixtures()
+        self.original = stage
+        index = {obj: i for i, obj in enumerate(stage.objects)}
+        self.classes = [type(obj) for obj in stage.objects]
+        self.fixtures = [obj if obj.is_fixture else None for obj in stage.objects]  # Shared by every copy
+        self.shared = []  # Per object, (attribute, value) pairs to copy as they are
+        self.references = []  # Per object, (attribute, index of the object it points at, or None for the stage)
+        self.others = []  # Per object, (attribute, value) pairs that need their references swapped over
+        for obj in stage.objects:
+            shared, references, others = [], [], []
+            for name in () if obj.is_fixture else _slots(type(obj)) + tuple(getattr(obj, '__dict__', ())):
+                value = getattr(obj, name, _copy_state)
+                if value is _copy_state:  # Never set
+                    continue
+                if type(value) in _SHARED:
+                    shared.append((name, value))
+                elif value is stage:
+                    references.append((name, None))
+                elif isinstance(value, Thing):
+                    references.append((name, index[value]))
+                else:
+                    others.append((name, value))
+            self.shared.append(shared)
+            self.references.append(references)
+            self.others.append(others)
+
+def _blank(obj):
+    """An uninitialised object of the same class, to copy state into"""
+    return object.__new__(type(obj))
+
+@functools.lru_cache(maxsize=None)
+def _slots(cls):
+    """The names of all the slots an instance of a class has"""
+    return tuple(name for base in cls.__mro__ for name in base.__dict__.get('__slots__', ()))
+
+def _copy_state(obj, clone, objects):
+    """Copy every slot (and the __dict__, if there is one) of `obj` over to `clone`"""
+    for name in _slots(type(obj)):
+        value = getattr(obj, name, _copy_state)
+        if value is _copy_state:  # Skip slots that were never set
+            continue
+        if type(value) not in _SHARED:  # Most slots are plain values, so skip the call for those
+            value = _counterpart(value, objects)
+        setattr(clone, name, value)
+    if hasattr(obj, '__dict__'):
+        clone.__dict__.update((name, _counterpart(value, objects)) for name, value in obj.__dict__.items())
+
+_SHARED = frozenset((str, int, float, bool, type(None)))  # Immutable, and never point at anything on a stage
+
+def _counterpart(value, objects):
+    """Swap any references to objects on the original stage for the ones on the fork"""
+    if type(value) in _SHARED:
+        return value
+    if isinstance(value, (Thing, Stage)):
+        return objects[value]
+    if isinstance(value, types.MethodType) and value.__self__ in objects:
+        return getattr(objects[value.__self__], value.__name__)
+    if isinstance(value, tuple):
+        return tuple(_counterpart(item, objects) for item in value)
+    if isinstance(value, list):
+        return [_counterpart(item, objects) for item in value]
+    if isinstance(value, collections.deque):
+        return collections.deque(_counterpart(item, objects) for item in value)
+    if isinstance(value, dict):
+        return {_counterpart(key, objects): _counterpart(item, objects) for key, item in value.items()}
+    return value
+
+def check_initiative(stage):
+    """Find out who gets to move next"""
+    return stage.initiative.next_actor(stage.elapsed_time)
+
+def action(stage, actor):
+    """At each step, evaluate what happens next. The actor keeps the floor for as long as they
+    keep winning initiative, or until the scene runs out of steps."""
+    while True:
+        # By default, let the current actor do his thing
+        actor.set_starting_location(actor.default_location)
+        actor.act()
+        stage.touch(actor)
 
-stage = Stage()
-
-def check_initiative(actors):
-    """For each actor, find out who gets to move next"""
-    return max(actors, key=lambda x: x.initiative(), default=actors[0])
-
-def action(actor):
-    """At each step, evaluate what happens next"""
-    # By default, let the current actor do his thing
-    log.debug("Starting action for actor %s", actor)
-    actor.set_starting_location(actor.default_location)
-    actor.act()
-
-    stage.elapsed_time += 1
-
-    # Determine who acts next
-    next_actor = check_initiative(stage.actors)
-    if next_actor.escaped:
-        return next_actor
-
-    # If it's the same actor, just call this again
-    if next_actor == actor:
-        return action(actor)
+        stage.elapsed_time += 1
 
-    return next_actor
+        # Determine who acts next
+        next_actor = check_initiative(stage)
+        if next_actor.escaped or next_actor != actor or stage.elapsed_time >= stage.max_steps:
+            return next_actor
 
 class Thing(object):
-    """An object with a name"""
-    location = None
+    """An object with a name. World objects use __slots__ rather than a __dict__ each, since a
+    batch run can keep a great many stages in memory at once.
+
+    Fixtures are shared by every copy of a stage, so once a stage has been copied (or compiled into a
+    Template) its fixtures belong to none of the copies, and their `stage` is cleared. Nothing a
+    fixture does after the stage is built may go through it."""
+    __slots__ = ('stage', 'name', 'preposition', 'location')
+    is_fixture = False  # Never changes once the stage is built, so copies of the stage can share it
 
     def move_to(self, place):
         """Move an object from a current container (if it has one) to a new one."""
-        # Drop it from its current location if it has one
-        if self.location:
-            self.location = None
+        self.stage.relocate(self, self.location, place)
         self.location = place
 
-    def __init__(self, name, preposition='on'):
-        stage.objects.append(self)
+    def __init__(self, stage, name, preposition='on'):
+        self.stage = stage
         self.name = name
         self.preposition = preposition
+        self.location = None
+        self.stage.add(self)
 
     def __repr__(self):
         return self.name
@@ -97,37 +750,47 @@ class Thing(object):
             if isinstance(self.location, Thing):
                 return "the {} is {} the {}".format(self.name, self.location.preposition, self.location.name).capitalize()
 
+class BodyPart(Thing):
+    """A hand or a body, somewhere for a Person to hold or wear things. Which Person it belongs to is
+    kept by the stage, so the part itself never changes."""
+    __slots__ = ()
+    is_fixture = True
+
 class Place(Thing):
     """A Place never has a location, and it doesn't print itself out in the world description."""
+    __slots__ = ()
     is_open = True
     is_openable = False
+    is_fixture = True
 
-    def __init__(self, name=None):
-        super(Place, self).__init__(name)
-        stage.places.append(self)
+    def __init__(self, stage, name=None):
+        super(Place, self).__init__(stage, name)
+        self.stage.places.append(self)
 
 class Door(Place):
     """A door is a place that can be open or closed. If it's open, we'll print a different message when the actor
     moves through it than an ordinary place"""
+    __slots__ = ('is_open',)
     is_openable = True
-    is_open = False
+    is_fixture = False
+
+    def __init__(self, stage, name=None):
+        super(Door, self).__init__(stage, name)
+        self.is_open = False
 
     def close(self):
-        print("close door")
+        self.stage.emit('close', self.name)
         self.is_open = False
 
     def open(self):
-        print("open door")
+        self.stage.emit('open', self.name)
         self.is_open = True
 
 class Person(Thing):
     """A person who has hands and a location and will exhibit behavior"""
-    stage = None  # Hook for the world model
-    enemy = None  # Kinda cheating but makes things easy
-    default_location = None
-    health = 0  # -1 is dead, but we'll revive them on init
-    is_dead = False
-    inebriation = 0
+    __slots__ = ('enemy', 'faction', 'default_location', 'exit', 'health', 'is_dead', 'inebriation', 'path', 'queue',
+                 'right_hand', 'left_hand', 'body', 'parts', 'held', 'escaped', 'branch',
+                 'gun', 'glass', 'bottle', 'money', 'window')
 
     def initiative(self):
         """Return a value representative of how much this actor wants to do something based on their state"""
@@ -138,150 +801,188 @@ class Person(Thing):
         if self.health <= 0:
             return 9999
 
-        actor_initiative = random.randrange(0, DEFAULT_INITIATIVE)
+        actor_initiative = self.stage.rng.randrange(0, DEFAULT_INITIATIVE)
 
         if len(self.path) > 0:  # Actor really wants to be somewhere
             actor_initiative += HIGH_INITIATIVE
-            #log.debug("+ %s init change for path movement: %s/%s", self.name, HIGH_INITIATIVE, actor_initiative)
 
         # If they're injured they're pretty mad
         injury_bonus = DEFAULT_HEALTH - self.health
         actor_initiative += injury_bonus
-        #log.debug("+ %s init change for injury bonus: %s/%s", self.name, injury_bonus, actor_initiative)
 
         # They're also more excited if they're almost out of bullets
         if self.get_if_held(Gun):
             bullet_bonus = 10 if self.get_if_held(Gun).num_bullets == 1 else 0
             actor_initiative += bullet_bonus
-            #log.debug("- %s init change for bullet bonus: %s/%s", self.name, bullet_bonus, actor_initiative)
 
         return max(1, actor_initiative)
 
     def act(self):
+        """Take a turn. Behaviors that turn out to be no-ops are retried, up to MAX_RETRIES times.
+        If the stage is collecting metrics, each attempt is counted and timed under the branch
+        that `step` took."""
+        metrics = self.stage.metrics
+        for _ in range(MAX_RETRIES):
+            if metrics is None:
+                result = self.step()
+            else:
+                start = time.perf_counter()
+                result = self.step()
+                metrics.record(self.branch, time.perf_counter() - start)
+            if result is not RETRY:
+                return result
+            if metrics is not None:
+                metrics.count('retries')
+        log.debug("%s gave up after %s tries", self.name, MAX_RETRIES)
+        return False
+
+    def step(self):
         """Do whatever is the next queued event"""
         # If the actor just died, oops
         if self.health <= 0:
-            print("{} dies.".format(self.name))
+            self.branch = 'die'
+            self.stage.emit('dies', self.name)
             self.is_dead = True
             return
 
         # If there's a queued event, hit that first
-        if len(self.queue) > 0:
-            cmd, *args = self.queue[0]
-            log.debug("Running queued command: %s %s", cmd, args)
-            if args:
-                cmd(*args)
-            else:
-                cmd()
-            self.queue = self.queue[1:]
+        if self.queue:
+            self.branch = 'queued command'
+            cmd, args = self.queue.popleft()
+            cmd(*args)
             return
 
         # If there's a target location, try to go there
-        if len(self.path) > 0:
-            log.debug("Got a path event, walking it")
-            next_location = self.path[0]
-            if self.go(next_location):
-                # If going there was successful, set their new location and drop it from the path
-                self.path = self.path[1:]
+        if self.path:
+            self.branch = 'go'
+            if self.go(self.path[0]):
+                # If we got there, drop it from the path
+                self.path.popleft()
             return
 
-        # If the enemy is present, try to kill them!
-        if self.enemy_is_present():
+        # If the enemy is present, try to kill them! (If there's a gun to do it with)
+        if self.gun is not None and self.enemy_is_present():
             # If we don't have the gun, go find it!
-            if isinstance(self, Sheriff):  # Lame
-                gun = stage.find("sheriff's gun")
-            else:
-                gun = stage.find("gun")
+            gun = self.gun
             if self.get_if_held(gun):
+                self.branch = 'shoot'
                 self.shoot(self.enemy)
             else:
-                # Immediately go to the location where the gun is (unless the location is a supporter)
-                target_location = gun.location
-                self.go(target_location)
+                self.branch = 'fetch gun'
+                # Immediately head for the location where the gun is (unless the location is a supporter).
+                # If it's in another room, keep walking, and pick this up again once we're there
+                if not self.go(gun.location):
+                    self.set_path([gun.location])
+                    return
                 # ...then queue taking the gun and shooting it!
-                self.queue.append((self.shoot, self.enemy))
-                self.queue.append((self.take, gun))
+                self.push_back(self.take, gun)
+                self.push_back(self.shoot, self.enemy)
             return
 
         # If the enemy is dead, take the money and run
-        if self.enemy.is_dead:
+        if self.faction is not None and not self.stage.hostiles_alive(self):
             # Blow out the gun if we still have it
             gun = self.get_if_held(Gun)
             holster = self.get_if_held(Holster)
+            self.branch = 'take money'
             if gun and not gun.location == holster:
-                print("blow out barrel")
-                self.queue.append((self.drop, gun, holster))
+                self.stage.emit('blow out', gun.name)
+                self.push_back(self.drop, gun, holster)
                 return True
-            log.debug("*** Trying to get the money")
-            money = self.stage.find('money')
-            if self.location == money.location:
+            money = self.money
+            if money is not None and self.location == money.location:
                 return self.take(money)
-            # End game! Flee with the money!
-            if self.get_if_held('money'):
-                self.path = ['door', None]
+            # ...or off the body of whoever died holding it
+            holder = self.stage.owner(money.location) if money is not None else None
+            if holder is not None and not holder.is_alive and self.location == holder.location:
+                return self.take(money)
+            # End game! Flee with the money! (Or just flee, if there isn't any)
+            if money is None or self.get_if_held(money):
+                self.set_path([self.exit, None] if self.exit is not None else [])
                 self.escaped = True
 
         # Random behaviors
-        weighted_choice = [('drink', 5), ('wander', 3), ('check', 1), ('lean', 1), ('count', 1), ('drop', 1)]
-        choice = random.choice([val for val, cnt in weighted_choice for i in range(cnt)])
-        log.debug("%s chose to %s", self.name, choice)
-        if choice == 'drink':
-            # Try to drink from the glass if we're holding it
-            glass = stage.find('glass')
-            if self.get_if_held('glass'):
-                # ...and it's full, just drink from it
-                if glass.full:
-                    glass.drink(self)
-                    return True
-                # If not, try to pour a glass from the bottle
-                else:
-                    bottle = stage.find('bottle')
-                    if self.get_if_held(bottle):
-                        bottle.pour(glass)
-                        # Be sure to add queued events in reverse order because queues
-                        self.queue.append((glass.drink, self))
-                        self.queue.append((self.take, glass))
-                        return True
-                    # If we don't have the bottle and can reach it, take it and
-                    # then queue pouring it and drinking from it
-                    else:
-                        if self.can_reach_obj(bottle):
-                            self.take(bottle)
-                            self.queue.append((glass.drink, self))
-                            self.queue.append((self.take, glass))
-                            self.queue.append((bottle.pour, glass))
-                            return True
-            # If we don't have the glass, try to get it
-            else:
-                if self.can_reach_obj(glass):
-                    self.take(glass)
-                    return True
-        elif choice == 'wander':
-            return self.go_to_random_location()
-        elif choice == 'check':
-            if self.get_if_held(Gun):
-                print("check gun")
-                return True
-        elif choice == 'count':
-            if self.can_reach_obj(stage.find('money')):
-                print("count money")
+        choice = self.branch = BEHAVIORS.choose(self.stage.rng)
+        if BEHAVIOR_POLICY[choice](self):
+            return True
+        # If we fell threw and did nothing, try again
+        return RETRY
+
+    def resolve(self):
+        """Look up the props this actor's behavior refers to, once at the start of the scene. An
+        actor's own gun is whichever one they start out holding. A prop the scenario doesn't have
+        is left as None, and whatever needs it is skipped."""
+        stage = self.stage
+        handles = stage.handles
+        self.gun = self.get_if_held(Gun) or stage.get(handles['gun'])
+        self.glass = stage.get(handles['glass'])
+        self.bottle = stage.get(handles['bottle'])
+        self.money = stage.get(handles['money'])
+        self.window = stage.get(handles['window'])
+
+    def drink_behavior(self):
+        """Drink, pour a drink, or go for the glass"""
+        # Try to drink from the glass if we're holding it
+        glass = self.glass
+        if glass is None:
+            return
+        if self.get_if_held(glass):
+            # ...and it's full, just drink from it
+            if glass.full:
+                glass.drink(self)
                 return True
-        elif choice == 'lean':
-            if self.location == stage.find('window'):
-                print('lean on window and look')
+            # If not, try to pour a glass from the bottle
+            bottle = self.bottle
+            if bottle is None:
+                return
+            if self.get_if_held(bottle):
+                bottle.pour(glass)
+                self.push_back(self.take, glass)
+                self.push_back(glass.drink, self)
                 return True
-        elif choice == 'drop':  # Drop a random object that isn't the gun
-            obj = self.get_held_obj(self.right_hand)
-            if obj and not isinstance(obj, Gun):
-                self.drop(obj, self.location)
+            # If we don't have the bottle and can reach it, take it and
+            # then queue pouring it and drinking from it
+            if self.can_reach_obj(bottle):
+                self.take(bottle)
+                self.push_back(bottle.pour, glass)
+                self.push_back(self.take, glass)
+                self.push_back(glass.drink, self)
                 return True
-            else:
-                obj = self.get_held_obj(self.left_hand)
-                if obj and not isinstance(obj, Gun):
-                    self.drop(obj, self.location)
-                    return True
-        # If we fell threw and did nothing, try again
-        return self.act()
+        # If we don't have the glass, try to get it
+        elif self.can_reach_obj(glass):
+            self.take(glass)
+            return True
+
+    def wander_behavior(self):
+        self.go_to_random_location()
+        return True
+
+    def check_behavior(self):
+        gun = self.get_if_held(Gun)
+        if gun:
+            self.stage.emit('check', gun.name)
+            return True
+
+    def count_behavior(self):
+        if self.money is not None and self.can_reach_obj(self.money):
+            self.stage.emit('count', self.money.name)
+            return True
+
+    def lean_behavior(self):
+        if self.window is not None and self.location == self.window:
+            self.stage.emit('lean', self.window.name)
+            return True
+
+    def drop_behavior(self):
+        """Drop a random object that isn't the gun"""
+        obj = self.get_held_obj(self.right_hand)
+        if obj and not isinstance(obj, Gun):
+            self.drop(obj, self.location)
+            return True
+        obj = self.get_held_obj(self.left_hand)
+        if obj and not isinstance(obj, Gun):
+            self.drop(obj, self.location)
+            return True
 
     def can_reach_obj(self, obj):
         """True if the Person can reach the object in question. The object must be either directly
@@ -293,49 +994,80 @@ class Person(Thing):
 
     def take(self, obj):
         """Try to take an object. If there's no hand available, drop an object and queue taking
-        the object. Return True if the object was taken or False if no hands available."""
+        the object. Return True if the object was taken or False if no hands available. Anything out
+        of reach is left where it is: it has to be in our hands already, reachable (see
+        `can_reach_obj`), or on the body of somebody at the same place."""
+        holder = self.stage.owner(obj.location)
+        if not (self.can_reach_obj(obj) or holder is self or
+                holder is not None and holder.location is not None and holder.location == self.location):
+            return False
         free_hand = self.free_hand()
         if free_hand:
-            print("pick up the {} with the {}".format(obj, free_hand))
+            self.stage.emit('take', obj.name, free_hand.name)
             obj.move_to(free_hand)
             return True
         else:
-            # Drop the thing in a random hand and queue picking up the thing
-            self.drop(self.get_held_obj(random.choice((self.right_hand, self.left_hand))), self.location)
-            self.queue.append((self.take, obj))
+            # Drop the thing in a random hand and try picking up the thing again straight away
+            self.drop(self.get_held_obj(self.stage.rng.choice((self.right_hand, self.left_hand))), self.location)
+            self.push_front(self.take, obj)
 
 
     def go_to_random_location(self):
         """Randomly go to a location that isn't the current one"""
-        location = random.choice([place for place in stage.places if place != self.location and not isinstance(place, Door)])
-        self.go(location)
+        location = self.stage.rng.choice([place for place in self.stage.places if place != self.location and not isinstance(place, Door)])
+        if not self.go(location):
+            self.set_path([location])  # It's in another room, so keep walking
+
+    def join(self, faction):
+        """Take a side"""
+        self.faction = faction
+        self.stage.enlist(self)
 
     def enemy_is_present(self):
-        """Is the enemy visible and suitably shootable?"""
-        return self.enemy.location != None and self.enemy.is_alive
+        """Is an enemy visible and suitably shootable? We stick with the one we're after for as long
+        as they are, and otherwise take the first hostile to have come into the room."""
+        enemy = self.enemy
+        if enemy is not None and enemy.is_alive and self.can_see(enemy):
+            return True
+        self.enemy = self.stage.hostile_to(self)
+        return self.enemy is not None
+
+    def can_see(self, other):
+        """Whether somebody is on stage in the same room as us"""
+        routes = self.stage.routes
+        return other.location is not None and routes.room(other.location) == routes.room(self.location)
 
     def shoot(self, target, aimed=False):
-        """Shoot first, ask questions never"""
+        """Shoot first, ask questions never. A shot lined up earlier (after aiming, or fetching the
+        gun) may find the target already dead or gone from the room, in which case we turn on
+        whoever else is there to shoot at (aiming afresh), or hold fire if nobody is."""
+        if not (target.is_alive and self.can_see(target)):
+            if not self.enemy_is_present():
+                return False
+            target, aimed = self.enemy, False
         gun = self.get_if_held(Gun)
         if gun:
             # Usually we'll aim and then fire, sometimes we'll just fire
             if not aimed:
-                if random.randint(0, 5) > 1:
-                    print("aim")
-                    self.queue.append((self.shoot, target, True))
+                if self.stage.rng.randint(0, 5) > 1:
+                    self.stage.emit('aim', target.name)
+                    self.push_front(self.shoot, target, True)
                     return False
-            print("fire")
-            log.debug("%s is trying to shoot %s", self.name, target.name)
+            self.stage.emit('fire', target.name)
             hit_weight = self.starting_hit_weight()
             if gun.num_bullets == 1:
                 hit_weight += 1
             if self.health < DEFAULT_HEALTH:
                 hit_weight += 1
 
-            weighted_hit_or_miss = [('miss', 3), ('nick', 3 * hit_weight), ('hit', 1 * hit_weight)]
-            hit_or_nick = random.choice([val for val, cnt in weighted_hit_or_miss for i in range(cnt)])
-            print(GUN_DAMAGE[hit_or_nick]['message'].format(target.name))
+            hit_or_nick = hit_sampler(hit_weight).choose(self.stage.rng)
+            self.stage.emit('shot', target.name, outcome=hit_or_nick)
+            was_alive = target.is_alive
             target.health += GUN_DAMAGE[hit_or_nick]['health']
+            self.stage.touch(target)
+            # Everybody cares about the death of the last of a side
+            if was_alive and not target.is_alive and self.stage.casualty(target):
+                self.stage.initiative.touch_all()
             gun.num_bullets -= 1
             return True
 
@@ -345,36 +1077,38 @@ class Person(Thing):
         return 1
 
     def go(self, location):
-        """Try to move to the next location. If that location can be opened, like a door, open it first.
-        Otherwise, set the new location.  If `location` is a string, find the
-        name of that location in the world."""
+        """Take one step towards a location, by the shortest route. If the next place on the way can
+        be opened, like a door, open it first. Returns True once we've arrived. If `location` is a
+        string, find the name of that location in the world."""
 
         if isinstance(location, str):
             location = self.stage.find(location)
+        hop = self.stage.routes.next_hop(self.stage, self.location, location)
 
-        log.debug("Trying to go to next location %s", location)
-
-        if location.is_openable and not location.is_open:
-            location.open()
+        if hop.is_openable and not hop.is_open:
+            hop.open()
             return False
 
-        if location.is_openable and location.is_open:
-            print("go through {}".format(location))
-            self.queue.append((location.close,))
+        if hop.is_openable and hop.is_open:
+            self.stage.emit('go through', hop.name)
+            self.push_back(hop.close)
         else:
-            print("go to {}".format(location))
+            self.stage.emit('go', hop.name)
 
-        self.location = location
-        return True
+        self.move_to(hop)
+        return hop is location
 
     def get_if_held(self, obj_name):
-        """Does the actor have the object name, object, or classname in any of its body parts? If so, return the container where it is"""
+        """Does the actor have the object name, object, or classname in any of its body parts? If so, return the container where it is.
+        A missing prop (None) is never held."""
+        if obj_name is None:
+            return None
         # First check if it's a classname (like Gun)
-        if inspect.isclass(obj_name):
-            # Check all the world models for objects of this type and try to find a match
-            for obj in stage.objects:
-                if isinstance(obj, obj_name) and obj.location in self.parts:
+        if isinstance(obj_name, type):
+            for obj in self.held:
+                if isinstance(obj, obj_name):
                     return obj
+            return None
 
         if isinstance(obj_name, str):
             # If not, try to find the named object
@@ -386,73 +1120,118 @@ class Person(Thing):
 
     def get_held_obj(self, part):
         """Get the object held by a given body part. Returns None if the body part isn't holding anything"""
-        for obj in stage.objects:
-            if obj.location == part:
-                return obj
+        for obj in self.stage.contents_of(part):
+            return obj
+
+    def hold(self, obj):
+        """Note that one of our body parts has just taken hold of an object"""
+        self.held.append(obj)
+
+    def release(self, obj):
+        """Note that one of our body parts has just let go of an object"""
+        self.held.remove(obj)
 
     def free_hand(self):
         """Return the hand that isn't holding anything"""
-        right_free = True
-        left_free = True
-        for obj in stage.objects:
-            if obj.location == self.right_hand:
-                right_free = False
-            elif obj.location == self.left_hand:
-                left_free = False
-        if right_free:
+        if not self.stage.contents_of(self.right_hand):
             return self.right_hand
-        if left_free:
+        if not self.stage.contents_of(self.left_hand):
             return self.left_hand
 
+    def push_back(self, cmd, *args):
+        """Queue a command to run after everything already queued"""
+        if self.queue == ():  # Nothing queued yet, ever
+            self.queue = collections.deque()
+        self.queue.append((cmd, args))
+
+    def push_front(self, cmd, *args):
+        """Queue a command to run before anything else that's queued"""
+        if self.queue == ():
+            self.queue = collections.deque()
+        self.queue.appendleft((cmd, args))
+
+    def pending(self):
+        """The queued commands as (name, args) pairs, next one first"""
+        return [(cmd.__name__, args) for cmd, args in self.queue]
+
+    def set_path(self, places):
+        """Start walking a path of Places (or place names), replacing any path already under way. The
+        places are waypoints: getting from one to the next can take as many steps as the route needs."""
+        self.path = collections.deque(places)
+
     @property
     def is_alive(self):
         return self.health > 0
 
     def set_starting_location(self, location):
-        """Setting the starting location changes the world model and also prints an explicit
+        """Setting the starting location changes the world model and also reports an explicit
         message. It's idempotent and so safe to call in a loop because I'm lazy"""
         if location and not self.location:
-            self.location = location
-            print("(The {} is at the {}.)".format(self.name, self.location.name))
+            self.move_to(location)
+            self.stage.emit('arrive', self.name, self.location.name)
 
     def drop(self, obj, target):
-        """Drop an object in a place or on a supporting object. Is a no-op if the actor doesn't have the object."""
-        if self.get_if_held(obj.name):
-            print("put {} {} {}".format(obj.name, target.preposition, target.name))
+        """Drop an object in a place or on a supporting object. Is a no-op if the actor doesn't have the
+        object, or it's a fixture (like a holster) that stays put."""
+        if self.get_if_held(obj) and not obj.is_fixture:
+            self.stage.emit('drop', obj.name, target.preposition, target.name)
             obj.move_to(target)
 
-    def __init__(self, name):
-        super(Person, self).__init__(name)
-        self.health = DEFAULT_HEALTH
-        self.path = []  # A path of Places the person is currently walking
-        self.queue = []  # A queue of functions to call next
-        self.right_hand = Thing("{}'s right hand".format(self.name), preposition='in')
-        self.left_hand = Thing("{}'s left hand".format(self.name), preposition='in')
-        self.body = Thing("{}".format(self.name))
-        self.parts = [self.left_hand, self.right_hand, self.body]
+    def __init__(self, stage, name):
+        super(Person, self).__init__(stage, name)
+        self.enemy = None  # Who we're currently after
+        self.faction = None  # Anybody in a different faction is fair game; nobody bothers bystanders (None)
+        self.default_location = None
+        self.exit = None  # The way out, once the scene is won
+        self.health = DEFAULT_HEALTH  # -1 is dead
+        self.is_dead = False
+        self.inebriation = 0
+        self.path = ()  # A path of Places the person is currently walking (a deque, once there is one)
+        self.queue = ()  # A queue of (function, args) to call next (likewise)
+        self.right_hand = BodyPart(stage, "{}'s right hand".format(self.name), preposition='in')
+        self.left_hand = BodyPart(stage, "{}'s left hand".format(self.name), preposition='in')
+        self.body = BodyPart(stage, "{}".format(self.name))
+        self.parts = (self.left_hand, self.right_hand, self.body)
+        self.held = []  # Whatever is in our hands or on our body, in the order we got hold of it. Never more than a few things.
         self.escaped = False  # The final endgame state
+        self.branch = None  # The decision branch taken by the last step, for metrics
+        self.gun = self.glass = self.bottle = self.money = self.window = None  # Props, once resolved
+        stage.add_actor(self)
+
+# What each of the random behaviors does; each returns True if the actor actually did something
+BEHAVIOR_POLICY = {'drink': Person.drink_behavior,
+                   'wander': Person.wander_behavior,
+                   'check': Person.check_behavior,
+                   'lean': Person.lean_behavior,
+                   'count': Person.count_behavior,
+                   'drop': Person.drop_behavior}
 
 class Robber(Person):
     """The Robber wants to deposit the money, drink, kill the sheriff, and escape with the money"""
+    __slots__ = ('stash',)
+
+    def __init__(self, stage, name):
+        super(Robber, self).__init__(stage, name)
+        self.stash = None  # Where to hide the money while the sheriff is still around
+
     def initiative(self):
         actor_initiative = super(Robber, self).initiative()
 
         # If the Robber has the money and the Sheriff is alive,
-        # the Robber wants to drop the money in the Corner
-        if self.get_if_held('money') and self.enemy.is_alive:
+        # the Robber wants to drop the money in the stash
+        if self.stash is not None and self.get_if_held(self.money) and self.stage.hostiles_alive(self):
             actor_initiative += HIGH_INITIATIVE
 
-        log.debug("%s is returning initiative %s", self.name, actor_initiative)
         return actor_initiative
 
-    def act(self):
+    def step(self):
         """A set of conditions of high priority; these actions will be executed first"""
-        if self.location.name == 'corner' and self.get_if_held('money') and self.enemy.is_alive:
-            money = self.get_if_held('money')
-            self.drop(money, self.location)
+        if self.location is self.stash and self.get_if_held(self.money) and self.stage.hostiles_alive(self):
+            self.branch = 'stash money'
+            self.drop(self.money, self.location)
             return True
 
-        return super(Robber, self).act()
+        return super(Robber, self).step()
 
     def starting_hit_weight(self):
         """The Robber (but _not_ the Sheriff) is a better shot if he's drunk"""
@@ -461,9 +1240,13 @@ class Robber(Person):
 class Sheriff(Person):
     """The Sheriff wants to kill the Robber and leave with the money. He does not get a drink bonus and arrives
     on a delay."""
-    def __init__(self, name, delay):
-        super(Sheriff, self).__init__(name)
+    __slots__ = ('delay', 'entrance')
+
+    def __init__(self, stage, name, delay):
+        super(Sheriff, self).__init__(stage, name)
         self.delay = delay
+        self.entrance = ()  # The way in from offstage
+        stage.initiative.wake_at(delay, self)
 
     def initiative(self):
         actor_initiative = super(Sheriff, self).initiative()
@@ -476,14 +1259,13 @@ class Sheriff(Person):
             # If they haven't moved, tell them they want to move to the table
             actor_initiative += HIGH_INITIATIVE
 
-        log.debug("%s is returning initiative %s", self.name, actor_initiative)
         return actor_initiative
 
-    def act(self):
+    def step(self):
         """The Sheriff wants to get in the house right away"""
-        if self.location == None:
-            self.path = ['window', 'door']
-        return super(Sheriff, self).act()
+        if self.location is None and self.entrance:
+            self.set_path(self.entrance)
+        return super(Sheriff, self).step()
 
     def starting_hit_weight(self):
         """The Sheriff (but _not_ the Robber) is a better shot if he's injured"""
@@ -494,21 +1276,27 @@ class Sheriff(Person):
 
 class Gun(Thing):
     """A Gun is an object with a distinct property of being shootable and having a number of bullets"""
-    num_bullets = 0
-    def __init__(self, name):
-        super(Gun, self).__init__(name)
+    __slots__ = ('num_bullets',)
+
+    def __init__(self, stage, name):
+        super(Gun, self).__init__(stage, name)
         self.num_bullets = DEFAULT_NUM_BULLETS
 
 class Holster(Thing):
-    def __init__(self, name, preposition='in'):
-        super(Holster, self).__init__(name, preposition=preposition)
+    """A holster is worn, never carried: it stays wherever the scenario puts it"""
+    __slots__ = ()
+    is_fixture = True
+
+    def __init__(self, stage, name, preposition='in'):
+        super(Holster, self).__init__(stage, name, preposition=preposition)
 
 class Container(Thing):
     """A Container is a vessel that can contain a thing (whisky)"""
-    volume = 0
+    __slots__ = ('volume',)
 
-    def __init__(self, name):
-        super(Container, self).__init__(name)
+    def __init__(self, stage, name):
+        super(Container, self).__init__(stage, name)
+        self.volume = 0
 
     @property
     def full(self):
@@ -521,7 +1309,7 @@ class Container(Thing):
         any less full because magic. If the source container is empty,
         this is a no-op. Returns True if the pour succeeded."""
         if self.full:
-            print("pour")
+            self.stage.emit('pour', self.name, new_container.name)
             new_container.volume = 3
             return True
 
@@ -530,84 +1318,282 @@ class Container(Thing):
         of the actor. Drinking from an empty glass has no effect.
         Returns True if the drink succeeded."""
         if self.full:
-            print("take a drink from {}".format(self))
+            self.stage.emit('drink', self.name)
             actor.inebriation += 1
             self.volume -= 1
             return True
 
-def init(delay):
-    """Initialize the starting conditions"""
-
-    # Humans
-    robber = Robber('robber')
-    robber_gun = Gun('gun')
-    robber_gun.move_to(robber.right_hand)
-    money = Thing('money')
-    money.move_to(robber.left_hand)
-    robber_holster = Holster('holster')
-    robber_holster.move_to(robber.body)
-    robber.stage = stage  # A mechanism to get ahold of the world state
-
-    sheriff = Sheriff('sheriff', delay=delay)
-    sheriff_gun = Gun("sheriff's gun")
-    sheriff_gun.move_to(sheriff.right_hand)
-    holster = Holster("sheriff's holster")
-    holster.move_to(sheriff.body)
-
-    sheriff.stage = stage
-    robber.enemy = sheriff
-    sheriff.enemy = robber
-
-    # Places
-    window = Place('window')
-    table = Place('table')
-    door = Door('door')
-    corner = Place('corner')
-
-    sheriff.default_location = None  # nowhere
-    robber.default_location = window
-    robber.path = [door, corner]
-
-    # Objects
-    glass = Container('glass')
-    bottle = Container('bottle')
-    bottle.volume = 10
-    glass.move_to(table)
-    bottle.move_to(table)
-
-    stage.current_scene += 1
-
-    loop()
-
-def loop():
-    """Main story loop, initialized by the delay before the sheriff arrives"""
+class Scenario(object):
+    """The starting conditions for a scene, described as plain data (see SALOON). The description is
+    only built out into objects once; every scene then starts from a copy of that, with the
+    sheriff's delay filled in.
+
+    A description has a `cast` of people, each with a name, a class, optionally a `location` to
+    arrive at, a `path` to walk, a `faction`, whether they arrive on the sheriff's `delay`, and the
+    `props` they start out holding (name, class, body part). Anybody armed without a faction fights
+    for themselves alone; anybody else without one is a bystander nobody bothers. A Sheriff can have an `entrance`, the
+    places to walk through on the way in from offstage, and a Robber a `stash` to hide the money in.
+    An entry with a `count` stands for that many people, with their number filled in for the {} in
+    their name and their props' names. Then come the `places` (name, class), the `exit` everybody
+    leaves by once they've won, and the loose `props` (name, class, place, and optionally a `volume`
+    to fill a container with). Objects are created in the order they're listed, which is the order
+    the scene describes them in. `handles` names the objects people's behaviors use, if they aren't
+    called what HANDLES calls them. A set that spans more than one room lists its `connections`, pairs
+    of places that are next to each other; without them, it's all one room."""
+    def build(self, stage, delay):
+        """Put the scenario's cast, set and props on an empty stage"""
+        stage.handles = dict(HANDLES, **self.description.get('handles', {}))
+        cast = []
+        for spec in self.description['cast']:
+            cls = CLASSES[spec['class']]
+            for number in range(1, spec.get('count', 1) + 1):
+                name = spec['name'].format(number) if 'count' in spec else spec['name']
+                actor = cls(stage, name, delay=delay) if spec.get('delay') else cls(stage, name)
+                armed = False
+                for prop_name, prop_class, part in spec.get('props', ()):
+                    prop_name = prop_name.format(number) if 'count' in spec else prop_name
+                    CLASSES[prop_class](stage, prop_name).move_to(getattr(actor, BODY_PARTS[part]))
+                    armed = armed or issubclass(CLASSES[prop_class], Gun)
+                if 'faction' in spec:
+                    actor.join(spec['faction'])
+                elif armed:
+                    actor.join(name)  # On nobody's side but their own
+                cast.append((actor, spec))
+
+        for name, place_class in self.description['places']:
+            CLASSES[place_class](stage, name)
+        if 'connections' in self.description:
+            if self.routes is None:
+                self.routes = Routes(stage.places, self.description['connections'])
+            stage.routes = self.routes
+        for actor, spec in cast:
+            if 'location' in spec:
+                actor.default_location = stage.find(spec['location'])
+            if 'path' in spec:
+                actor.set_path([stage.find(place) for place in spec['path']])
+            if 'entrance' in spec:
+                actor.entrance = tuple(stage.find(place) for place in spec['entrance'])
+            if 'stash' in spec:
+                actor.stash = stage.find(spec['stash'])
+            if 'exit' in self.description:
+                actor.exit = stage.find(self.description['exit'])
+
+        for spec in self.description.get('props', ()):
+            prop = CLASSES[spec['class']](stage, spec['name'])
+            if 'volume' in spec:
+                prop.volume = spec['volume']
+            prop.move_to(stage.find(spec['on']))
+
+    def template(self):
+        """The Template that every scene is stamped out from. It's built with no delay at all, and
+        `stage` sets the real one."""
+        if self._template is None:
+            stage = Stage(max_steps=MAX_STEPS)
+            self.build(stage, 0)
+            self._template = Template(stage)
+            self.delayed = [i for i, actor in enumerate(stage.actors) if isinstance(actor, Sheriff)]
+        return self._template
+
+    def stage(self, delay, scene=1, sink=None, metrics=None, rng=None):
+        """A fresh stage for a scene, ready to play"""
+        stage = self.template().stage(scene, sink, metrics, rng)
+        stage.max_steps = delay + MAX_STEPS
+        stage.initiative.alarms = []
+        for i in self.delayed:
+            actor = stage.actors[i]
+            actor.delay = delay
+            stage.initiative.wake_at(delay, actor)
+        return stage
+
+    def __init__(self, description):
+        self.description = description
+        self._template = None
+        self.delayed = []  # Where the people who arrive on the sheriff's delay are in the stage's actors
+        self.routes = None  # Worked out the first time the set is built
+
+def load_scenario(path):
+    """Read a Scenario description from a JSON file"""
+    with open(path) as f:
+        return Scenario(json.load(f))
+
+CLASSES = {cls.__name__: cls for cls in (Thing, Place, Door, Person, Robber, Sheriff, Gun, Holster, Container)}
+BODY_PARTS = {'right hand': 'right_hand', 'left hand': 'left_hand', 'body': 'body'}
+
+SALOON = Scenario({
+    'cast': [{'name': 'robber', 'class': 'Robber', 'location': 'window', 'path': ['door', 'corner'], 'stash': 'corner',
+              'faction': 'outlaws', 'props': [('gun', 'Gun', 'right hand'), ('money', 'Thing', 'left hand'), ('holster', 'Holster', 'body')]},
+             {'name': 'sheriff', 'class': 'Sheriff', 'delay': True, 'entrance': ['window', 'door'], 'faction': 'law',
+              'props': [("sheriff's gun", 'Gun', 'right hand'), ("sheriff's holster", 'Holster', 'body')]}],
+    'places': [('window', 'Place'), ('table', 'Place'), ('door', 'Door'), ('corner', 'Place')],
+    'exit': 'door',
+    'props': [{'name': 'glass', 'class': 'Container', 'on': 'table'},
+              {'name': 'bottle', 'class': 'Container', 'on': 'table', 'volume': 10}]})
+
+# The same saloon walked room by room: outside by the window, through the door to the table, and on
+# to the corner. People only see (and shoot at) whoever is at the same place.
+SALOON_MAP = Scenario(dict(SALOON.description, connections=[('window', 'door'), ('door', 'table'), ('table', 'corner')]))
+
+def init(delay, scene=1, sink=None, metrics=None, rng=None, scenario=SALOON):
+    """Initialize the starting conditions on a fresh stage and play the scene out. Events go to `sink`,
+    or to the screenplay on stdout if there isn't one, and random decisions come from `rng`. Returns
+    the stage."""
+    stage = scenario.stage(delay, scene, sink if sink is not None else ScreenplayRenderer(), metrics, rng)
+    loop(stage)
+    return stage
+
+def loop(stage, until=None):
+    """Main story loop, initialized by the delay before the sheriff arrives. `until` can stop the
+    scene part way through, as for `play`."""
     # Start with the world status
-    print ("\nAct 1 Scene {}\n\n".format(stage.current_scene))
+    stage.emit('scene', stage.current_scene)
     for obj in stage.objects:
         if not isinstance(obj, Person) and obj.status():
-            print(obj.status() + '.', end=" ")
-
-    print()
-    next_actor = stage.actors[0]
+            stage.emit('status', obj.name, obj.location.preposition, obj.location.name)
+
+    stage.emit('begin')
+    for actor in stage.actors:
+        actor.resolve()
+    stage.next_actor = stage.actors[0]
+    return play(stage, until)
+
+def play(stage, until=None):
+    """Play turns from wherever the scene has got to. If `until` is given, it's called with the stage
+    before each turn and play stops as soon as it returns True, leaving the stage ready to be
+    snapshotted and picked up again later. Returns True once the curtain has come down, straight
+    away if it already had."""
+    if stage.finished:
+        return True
     while True:
-        print()
-        print(next_actor.name.upper())
-
-        next_actor = action(next_actor)
-        if next_actor.escaped:
-            print("CURTAIN")
-            stage.objects = []
-            stage.places = []
+        if until is not None and until(stage):
+            stage.sink.flush()
+            return False
+        stage.actor = stage.next_actor
+        stage.emit('turn')
+
+        stage.next_actor = action(stage, stage.actor)
+        if stage.next_actor.escaped or stage.elapsed_time >= stage.max_steps:
+            stage.emit('curtain')
+            stage.finished = True
             break
+    stage.sink.flush()
+    if stage.metrics is not None:
+        stage.metrics.end_scene(stage)
+    return True
+
+def scene_seed(master_seed, scene):
+    """Each scene gets its own seed derived from the novel's master seed, so a scene plays out
+    the same way no matter which process runs it or in what order"""
+    return "{}:{}".format(master_seed, scene)
+
+def scene_rng(master_seed, scene):
+    """The random number generator for one scene of a novel. It depends on nothing but the master
+    seed and the scene number, so any scene can be played on its own."""
+    return random.Random(scene_seed(master_seed, scene))
+
+def generate_scene(delay, scene, master_seed, renderer=ScreenplayRenderer, metrics=None):
+    """Play one seeded scene and return its rendered text"""
+    out = io.StringIO()
+    init(delay, scene=scene, sink=renderer(out), metrics=metrics, rng=scene_rng(master_seed, scene))
+    return out.getvalue()
+
+def _generate_scene(args):
+    """Play one scene for generate_scenes, returning its text, its length in screenplay words and
+    (as a snapshot, since they have to come back from a worker) its metrics"""
+    delay, scene, master_seed, renderer, instrumented = args
+    metrics = Metrics() if instrumented else None
+    out = io.StringIO()
+    counter = WordCounter(renderer(out))
+    init(delay, scene=scene, sink=counter, metrics=metrics, rng=scene_rng(master_seed, scene))
+    return out.getvalue(), counter.words, metrics.snapshot() if instrumented else None
+
+def _generate_batch(batch):
+    """Play a batch of scenes in one go, so a worker isn't sent each one separately"""
+    return [_generate_scene(args) for args in batch]
+
+def generate_scenes(delay=DEFAULT_SHERIFF_DELAY, master_seed=0, max_scenes=None, target_words=None, workers=1,
+                    renderer=ScreenplayRenderer, metrics=None):
+    """Lazily yield the text of each scene in order, stopping after `max_scenes` scenes or as soon as
+    the running word count reaches `target_words`, whichever comes first (with neither, it goes on
+    forever). Words are counted as they would be in the screenplay, whatever the `renderer`. With
+    more than one worker, scenes are generated in batches a little ahead of the consumer by a
+    process pool; the output is identical to a serial run with the same master seed. If
+    `metrics` is given, every scene's metrics are merged into it."""
+    scenes = itertools.count(1) if max_scenes is None else range(1, max_scenes + 1)
+    jobs = ((delay, scene, master_seed, renderer, metrics is not None) for scene in scenes)
+    words = 0
+    if workers <= 1:
+        results = map(_generate_scene, jobs)
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = _lookahead(pool, jobs, workers * 2, BATCH_SIZE)
+    try:
+        for text, scene_words, snapshot in results:
+            if snapshot is not None:
+                metrics.merge(snapshot)
+            yield text
+            words += scene_words
+            if target_words is not None and words >= target_words:
+                return
+    finally:
+        if workers > 1:
+            pool.terminate()
+
+def _lookahead(pool, jobs, window, batch_size):
+    """Run jobs on the pool in batches of `batch_size`, keeping at most `window` batches in flight,
+    and yield results in order"""
+    batches = iter(lambda: list(itertools.islice(jobs, batch_size)), [])
+    pending = collections.deque()
+    for batch in itertools.islice(batches, window):
+        pending.append(pool.apply_async(_generate_batch, (batch,)))
+    while pending:
+        results = pending.popleft().get()
+        for batch in itertools.islice(batches, 1):
+            pending.append(pool.apply_async(_generate_batch, (batch,)))
+        yield from results
+
+def generate_novel(delay=DEFAULT_SHERIFF_DELAY, master_seed=0, num_scenes=MAX_SCENES, workers=1,
+                   renderer=ScreenplayRenderer, metrics=None):
+    """Yield the text of every scene of a novel `num_scenes` long"""
+    return generate_scenes(delay, master_seed, num_scenes, None, workers, renderer, metrics)
 
 if __name__ == '__main__':
-    delay = input('Select arrival time for SHERIFF or ENTER for default: ') or DEFAULT_SHERIFF_DELAY
-    print("""
+    parser = argparse.ArgumentParser(description='SAGA III: generate a teleplay in one act')
+    parser.add_argument('--delay', type=int, help='arrival time for the SHERIFF (prompts if not given)')
+    parser.add_argument('--seed', type=int, help='master seed; the same seed always produces the same novel')
+    parser.add_argument('--scenes', type=int, help='number of scenes to generate (default: {})'.format(MAX_SCENES))
+    parser.add_argument('--words', type=int, help='stop once the novel reaches this many words (NaNoGenMo wants {})'.format(NANOGENMO_WORDS))
+    parser.add_argument('--scene', type=int, help='play just this one scene of the novel, with no title')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--format', choices=sorted(RENDERERS), default='screenplay', help='output format')
+    parser.add_argument('--metrics', metavar='FILE', help='write counters and timings for the run to FILE as JSON')
+    args = parser.parse_args()
+
+    delay = args.delay
+    if delay is None:
+        delay = input('Select arrival time for SHERIFF or ENTER for default: ') or DEFAULT_SHERIFF_DELAY
+    master_seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+
+    renderer = RENDERERS[args.format]
+    metrics = Metrics() if args.metrics else None
+    if args.scene is not None:
+        scenes = [generate_scene(int(delay), args.scene, master_seed, renderer, metrics)]
+    else:
+        if renderer is TeleplayRenderer:
+            print("\n\n" + ''.join(layout(line) for line in ("SAGA III", "An Original Play", "by", "A Computer")))
+        elif renderer is ScreenplayRenderer:
+            print("""
 
 SAGA III
 An Original Play
 by
 A Computer """)
-
-    for i in range(0, MAX_SCENES):
-        init(delay=int(delay))
+        max_scenes = args.scenes if args.scenes or args.words else MAX_SCENES
+        scenes = generate_scenes(int(delay), master_seed, max_scenes, args.words, args.workers, renderer, metrics)
+
+    out = Renderer(sys.stdout)
+    for text in scenes:
+        out.write(text)
+    out.flush()
+    if metrics is not None:
+        with open(args.metrics, 'w') as f:
+            f.write(metrics.to_json())
@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Serve SAGA III live to any number of readers at once.
+
+Each client gets its own novel, streamed line by line as the scenes are generated. A client asks for
+one either with a plain HTTP GET or, over a bare TCP connection, by sending the query string on a
+line of its own:
+
+    curl -N 'http://localhost:8015/?delay=30&seed=7&scenes=5'
+    printf 'delay=30&seed=7&scenes=5\\n' | nc localhost 8015
+
+Parameters are `delay` (the sheriff's arrival time, up to MAX_DELAY), `seed`, `scenes` and `words`
+(stop after that many scenes or words; with neither the novel goes on until the client hangs up).
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import random
+import urllib.parse
+
+import saga
+
+log = logging.getLogger()
+
+DEFAULT_PORT = 8015
+MAX_DELAY = 10000  # A scene takes up to this many steps more than usual, so keep it to a few tenths of a second
+PARAMETERS = {'delay': saga.DEFAULT_SHERIFF_DELAY, 'seed': None, 'scenes': None, 'words': None}
+
+class Server(object):
+    """Streams scenes to clients. The simulation runs in a pool of worker processes so it never
+    holds up the event loop, and each client is only sent more once it has caught up with what it
+    was already sent."""
+    async def handle(self, reader, writer):
+        """Serve one client"""
+        try:
+            request = await reader.readline()
+            http = request.startswith(b'GET ')
+            if http:
+                target = request.split()[1:2]  # Empty on a bare "GET"
+                while (await reader.readline()).strip():  # Skip the headers
+                    pass
+                query = urllib.parse.urlsplit(target[0].decode('latin-1')).query if target else None
+            else:
+                query = request.decode('latin-1').strip()
+            try:
+                if query is None:
+                    raise ValueError("No path in the request")
+                params = parse(query)
+            except ValueError as e:
+                if http:
+                    writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\n')
+                writer.write("{}\n".format(e).encode('utf-8'))
+                return
+            if http:
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\nConnection: close\r\n\r\n')
+            await self.stream(writer, **params)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            log.debug("Client went away")
+        except concurrent.futures.process.BrokenProcessPool:
+            log.error("A worker process died; dropped the client and started a fresh pool")
+        finally:
+            writer.close()
+
+    async def stream(self, writer, delay, seed, scenes, words):
+        """Write out scenes one line at a time until the novel is finished"""
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        loop = asyncio.get_running_loop()
+        written = 0
+        scene = 1
+        while scenes is None or scene <= scenes:
+            pool = self.pool
+            try:
+                text = await loop.run_in_executor(pool, saga.generate_scene, delay, scene, seed)
+            except concurrent.futures.process.BrokenProcessPool:
+                self.restart(pool)
+                raise
+            for line in text.splitlines(keepends=True):
+                writer.write(line.encode('utf-8'))
+                await writer.drain()
+            written += len(text.split())
+            if words is not None and written >= words:
+                break
+            scene += 1
+
+    async def start(self, host, port):
+        """Start accepting clients in the background, and return the asyncio server doing it. With
+        port 0, any free port is used (see its `sockets`)."""
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def serve(self, host, port):
+        """Accept clients until cancelled"""
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    def restart(self, broken):
+        """Replace a pool that lost a worker. Once broken, a pool won't run anything else, and every
+        client using it finds out at once, so only the first one to get here starts a new one."""
+        if self.pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = self.new_pool()
+
+    def new_pool(self):
+        # Forked workers would inherit the sockets of whoever was connected at the time and keep
+        # them open after we hang up, so start them fresh instead
+        return concurrent.futures.ProcessPoolExecutor(self.workers, multiprocessing.get_context('spawn'))
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def __init__(self, workers=None):
+        self.workers = workers
+        self.pool = self.new_pool()
+
+def parse(query):
+    """Read the parameters for a novel out of a query string. Raises ValueError on anything unknown
+    or not a whole number, or a delay out of range."""
+    params = dict(PARAMETERS)
+    for name, value in urllib.parse.parse_qsl(query):
+        if name not in PARAMETERS:
+            raise ValueError("Unknown parameter: {}".format(name))
+        try:
+            params[name] = int(value)
+        except ValueError:
+            raise ValueError("{} must be a whole number".format(name))
+    if not 0 <= params['delay'] <= MAX_DELAY:
+        raise ValueError("delay must be between 0 and {}".format(MAX_DELAY))
+    return params
+
+async def fetch(host, port, **params):
+    """A minimal client: ask the server for a novel over plain TCP and return its text"""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write("{}\n".format(urllib.parse.urlencode(params)).encode('utf-8'))
+    await writer.drain()
+    text = await reader.read()
+    writer.close()
+    return text.decode('utf-8')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stream SAGA III scenes to many clients at once')
+    parser.add_argument('--host', default='localhost', help='address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port to listen on')
+    parser.add_argument('--workers', type=int, help='number of worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    server = Server(args.workers)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
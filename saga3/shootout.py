@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Outcome statistics for the shootout at the end of every scene.
+
+Rather than playing the whole scene out object by object, each run is just the handful of numbers
+that decide a gunfight: health, bullets, inebriation, who has aimed and each actor's last
+initiative roll. The rules are the same as Person.shoot, starting_hit_weight and initiative. A run
+starts once both actors are in the room with their guns and the money has been stashed, so the
+sheriff's delay only comes in through how drunk the robber got while waiting.
+
+Runs are played side by side in lock-step, with each step's random numbers drawn for all of them at
+once. It's still plain Python, one run at a time within a step, but with nothing else in the world to
+keep track of a shootout takes about twenty microseconds, some fifty times quicker than a whole scene:
+
+    python shootout.py --runs 100000 --inebriation 0 1 2 3 --health 3 5 8
+"""
+
+import argparse
+import array
+import bisect
+import collections
+import itertools
+import json
+import random
+
+import saga
+
+ROBBER = 0
+SHERIFF = 1
+NOBODY = -1
+WINNERS = {ROBBER: 'robber', SHERIFF: 'sheriff', NOBODY: 'nobody'}
+ROBBER_, SHERIFF_ = 0, 6  # Where each side's state starts in a run
+ROLL_LIFETIME = 2  # Steps an initiative roll lasts, as in InitiativeQueue with two actors
+
+class Outcomes(object):
+    """How each run came out: who won, how many actions it took and how many shots
+    were fired"""
+    def distribution(self):
+        """Summarise the runs as plain dicts of frequencies"""
+        runs = len(self.winner)
+        winners = collections.Counter(self.winner)
+        return {'runs': runs,
+                'winner': {WINNERS[w]: winners[w] / runs for w in sorted(WINNERS)},
+                'duration': _histogram(self.duration),
+                'shots': _histogram(self.shots)}
+
+    def __init__(self, runs):
+        self.winner = array.array('b', [NOBODY]) * runs
+        self.duration = array.array('l', [0]) * runs  # Actions taken, up to and including the fatal shot
+        self.shots = array.array('l', [0]) * runs
+
+def _histogram(values):
+    counts = collections.Counter(values)
+    return {'mean': sum(values) / len(values),
+            'min': min(values),
+            'max': max(values),
+            'counts': dict(sorted(counts.items()))}
+
+def simulate(runs, inebriation=0, health=saga.DEFAULT_HEALTH, bullets=saga.DEFAULT_NUM_BULLETS,
+             damage=saga.GUN_DAMAGE, seed=None, max_steps=saga.MAX_STEPS):
+    """Play `runs` independent shootouts and return their Outcomes. `inebriation` is the robber's,
+    either one value for every run or a sequence with one per run. `health` and `bullets` stand in
+    for DEFAULT_HEALTH and DEFAULT_NUM_BULLETS, and `damage` for GUN_DAMAGE.
+
+    Runs go forward in lock-step, one step for all of them at a time, and drop out as they finish.
+    Each step's random numbers for every run still going are drawn in one go, and hits are looked up
+    in a table per hit weight rather than sampled."""
+    rng = random.Random(seed)
+    drinks = [inebriation] * runs if isinstance(inebriation, int) else list(itertools.islice(inebriation, runs))
+    wounds = {outcome: effect['health'] for outcome, effect in damage.items()}
+    hits = [None] + [_hits(weight, wounds) for weight in range(1, max(max(drinks, default=0) + 4, 6) + 1)]
+    outcomes = Outcomes(runs)
+    initiative = saga.DEFAULT_INITIATIVE
+    bonus = _bonus(health, bullets, health)
+    draws = _draws(rng, 2 * len(drinks))
+    # Each run is a list: for the robber and then the sheriff, [health, bullets, aimed, initiative
+    # roll, when it was rolled, roll bonus], then the robber's starting hit weight, shots fired and
+    # which run it is
+    active = [[health, bullets, False, max(1, draws[2 * run] % initiative + bonus), 0, bonus,
+               health, bullets, False, max(1, draws[2 * run + 1] % initiative + bonus), 0, bonus,
+               drinks[run] + 2, 0, run] for run in range(len(drinks))]
+    step = 0
+    while active and step < max_steps:
+        draws = _draws(rng, 5 * len(active))  # For an expired roll, aiming, the hit and two new rolls
+        k = -5
+        still = []
+        for run in active:
+            k += 5
+            # Whoever's state changed was rolled for again last step; the other roll may have run out
+            if step - run[4] >= ROLL_LIFETIME:
+                roll = draws[k] % initiative + run[5]
+                run[3] = roll if roll > 1 else 1
+                run[4] = step
+            elif step - run[10] >= ROLL_LIFETIME:
+                roll = draws[k] % initiative + run[11]
+                run[9] = roll if roll > 1 else 1
+                run[10] = step
+            if run[9] > run[3]:  # Ties go to the robber
+                actor, target = SHERIFF_, ROBBER_
+            else:
+                actor, target = ROBBER_, SHERIFF_
+            if not run[actor + 2] and draws[k + 1] % 6 > 1:
+                run[actor + 2] = True
+            else:
+                run[actor + 2] = False
+                hp = run[actor]
+                if actor == ROBBER_:
+                    hit_weight = run[12]
+                else:
+                    hit_weight = 4 if hp < health else 1
+                if run[actor + 1] == 1:
+                    hit_weight += 1
+                if hp < health:
+                    hit_weight += 1
+                table = hits[hit_weight]
+                run[target] += table[draws[k + 2] % len(table)]
+                run[actor + 1] -= 1
+                run[13] += 1
+                if run[target] <= 0:
+                    outcomes.winner[run[14]] = ROBBER if actor == ROBBER_ else SHERIFF
+                    outcomes.duration[run[14]] = step + 1
+                    outcomes.shots[run[14]] = run[13]
+                    continue
+                run[actor + 5] = _bonus(run[actor], run[actor + 1], health)
+                bonus = run[target + 5] = _bonus(run[target], run[target + 1], health)
+                roll = draws[k + 3] % initiative + bonus
+                run[target + 3] = roll if roll > 1 else 1
+                run[target + 4] = step + 1
+            roll = draws[k + 4] % initiative + run[actor + 5]
+            run[actor + 3] = roll if roll > 1 else 1
+            run[actor + 4] = step + 1
+            still.append(run)
+        active = still
+        step += 1
+    for run in active:  # Out of steps
+        outcomes.duration[run[14]] = step
+        outcomes.shots[run[14]] = run[13]
+    return outcomes
+
+def _bonus(hp, ammo, health):
+    """What Person.initiative adds to the roll for an actor who is in the room with a gun and no path
+    to walk"""
+    return health - hp + (10 if ammo == 1 else 0)
+
+def _hits(hit_weight, wounds):
+    """The damage done for each value randrange could give hit_sampler(hit_weight)"""
+    sampler = saga.hit_sampler(hit_weight)
+    return tuple(wounds[sampler.values[bisect.bisect_right(sampler.cumulative, n)]] for n in range(sampler.total))
+
+def _draws(rng, n):
+    """`n` random 32-bit numbers in one go"""
+    return memoryview(rng.getrandbits(32 * n).to_bytes(4 * n, 'little')).cast('I')
+
+def sweep(runs, seed=None, **grid):
+    """Run `simulate` for every combination of the parameter values in `grid`, e.g.
+    sweep(10000, inebriation=[0, 1, 2], health=[3, 5]). Yields (parameters, distribution) pairs."""
+    names = sorted(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(zip(names, values))
+        yield params, simulate(runs, seed=seed, **params).distribution()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Shootout outcome statistics for SAGA III')
+    parser.add_argument('--runs', type=int, default=10000, help='shootouts per combination of parameters')
+    parser.add_argument('--seed', type=int, help='seed for the random number generator')
+    parser.add_argument('--inebriation', type=int, nargs='+', default=[0], help="the robber's inebriation")
+    parser.add_argument('--health', type=int, nargs='+', default=[saga.DEFAULT_HEALTH], help='starting health')
+    parser.add_argument('--bullets', type=int, nargs='+', default=[saga.DEFAULT_NUM_BULLETS], help='starting bullets')
+    parser.add_argument('--json', action='store_true', help='print the full distributions as JSON')
+    args = parser.parse_args()
+
+    results = sweep(args.runs, args.seed, inebriation=args.inebriation, health=args.health, bullets=args.bullets)
+    if args.json:
+        print(json.dumps([{'parameters': params, 'outcomes': dist} for params, dist in results], indent=2))
+    else:
+        for params, dist in results:
+            print("inebriation {inebriation:2} health {health:2} bullets {bullets:2}: ".format(**params) +
+                  "robber {robber:6.1%} sheriff {sheriff:6.1%} ".format(**dist['winner']) +
+                  "{:5.1f} actions {:5.1f} shots".format(dist['duration']['mean'], dist['shots']['mean']))
@@ -0,0 +1,470 @@
+import asyncio
+import io
+import json
+import random
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import archive
+import bench
+import replay
+import saga
+import server
+import shootout
+
+class Events(object):
+    """A sink that keeps every event"""
+    def emit(self, event):
+        self.events.append(event)
+
+    def flush(self):
+        pass
+
+    def __init__(self):
+        self.events = []
+
+class Whereabouts(object):
+    """Follows the events of a scene to keep track of where everybody and everything is, by name"""
+    def follow(self, event):
+        if event.verb == 'arrive':
+            self.where[event.objects[0]] = event.objects[1]
+        elif event.verb in ('go', 'go through'):
+            self.where[event.actor] = event.objects[0]
+        elif event.verb in ('status', 'drop'):
+            self.where[event.objects[0]] = event.objects[2]
+        elif event.verb == 'take':
+            self.where[event.objects[0]] = event.objects[1]
+
+    def place(self, name):
+        """The place something is at, following it through whatever it's on or whoever holds it"""
+        while name is not None and name not in self.places:
+            name = self.where.get(self.owners.get(name, name))
+        return name
+
+    def __init__(self, stage):
+        self.places = {place.name for place in stage.places}
+        self.owners = {part.name: actor.name for actor in stage.actors for part in actor.parts}
+        self.where = {}
+
+def play(scenario, scene, delay=saga.DEFAULT_SHERIFF_DELAY, master_seed=7, sink=None):
+    stage = scenario.stage(delay, scene, sink, rng=saga.scene_rng(master_seed, scene))
+    saga.loop(stage)
+    return stage
+
+class SamplerTest(unittest.TestCase):
+    def test_same_picks_as_choice_over_the_expanded_list(self):
+        weights = (('drink', 5), ('wander', 3), ('never', 0), ('check', 1), ('count', 2))
+        expanded = [value for value, weight in weights for _ in range(weight)]
+        sampler = saga.WeightedSampler(weights)
+        for seed in range(200):
+            self.assertEqual(sampler.choose(random.Random(seed)), random.Random(seed).choice(expanded), seed)
+
+class QueueTest(unittest.TestCase):
+    def test_commands_run_in_order(self):
+        stage = saga.SALOON.stage(saga.DEFAULT_SHERIFF_DELAY)
+        robber = stage.find('robber')
+        self.assertEqual(robber.pending(), [])
+        robber.push_back(robber.go, 'table')
+        robber.push_back(robber.drop, 'money')
+        robber.push_front(robber.take, 'glass')
+        self.assertEqual(robber.pending(), [('take', ('glass',)), ('go', ('table',)), ('drop', ('money',))])
+
+    def test_a_drained_queue_is_kept(self):
+        stage = saga.SALOON.stage(saga.DEFAULT_SHERIFF_DELAY)
+        robber = stage.find('robber')
+        robber.push_back(robber.go, 'table')
+        queue = robber.queue
+        queue.popleft()
+        robber.push_front(robber.go, 'corner')
+        robber.push_back(robber.go, 'window')
+        self.assertIs(robber.queue, queue)
+
+class RoutesTest(unittest.TestCase):
+    def test_one_room(self):
+        stage = saga.SALOON.stage(saga.DEFAULT_SHERIFF_DELAY)
+        window, corner = stage.find('window'), stage.find('corner')
+        self.assertIs(stage.routes.next_hop(stage, window, corner), corner)
+
+    def test_next_hop_follows_connections(self):
+        stage = saga.SALOON_MAP.stage(saga.DEFAULT_SHERIFF_DELAY)
+        window, door, table, corner = (stage.find(name) for name in ('window', 'door', 'table', 'corner'))
+        self.assertIs(stage.routes.next_hop(stage, window, corner), door)
+        self.assertIs(stage.routes.next_hop(stage, door, corner), table)
+        self.assertIs(stage.routes.next_hop(stage, corner, window), table)
+        self.assertIs(stage.routes.next_hop(stage, None, corner), corner)  # Arriving from offstage
+
+    def test_walks_only_between_connected_places(self):
+        connected = set()
+        for a, b in saga.SALOON_MAP.description['connections']:
+            connected.update(((a, b), (b, a)))
+        for scene in range(1, 11):
+            sink = Events()
+            play(saga.SALOON_MAP, scene, sink=sink)
+            where = {}
+            for event in sink.events:
+                if event.verb == 'arrive':
+                    where[event.objects[0]] = event.objects[1]
+                elif event.verb in ('go', 'go through'):
+                    place = event.objects[0]
+                    if where.get(event.actor) not in (None, place):
+                        self.assertIn((where[event.actor], place), connected, (scene, event))
+                    where[event.actor] = place
+
+    def test_takes_and_shots_happen_in_the_same_room(self):
+        for scene in range(1, 101):
+            sink = Events()
+            whereabouts = Whereabouts(play(saga.SALOON_MAP, scene, sink=sink))
+            for event in sink.events:
+                if event.verb in ('take', 'fire'):
+                    self.assertEqual(whereabouts.place(event.objects[0]), whereabouts.place(event.actor), (scene, event))
+                whereabouts.follow(event)
+
+class InitiativeTest(unittest.TestCase):
+    def assertFinishes(self, scenario, scenes):
+        for scene in range(1, scenes + 1):
+            stage = play(scenario, scene)
+            self.assertLess(stage.elapsed_time, stage.max_steps, scene)
+
+    def test_saloon_scenes_finish(self):
+        self.assertFinishes(saga.SALOON, 50)
+
+    def test_multi_room_scenes_finish(self):
+        self.assertFinishes(saga.SALOON_MAP, 50)
+
+    def test_posse_scenes_finish(self):
+        self.assertFinishes(bench.POSSE, 3)
+
+class ScenarioTest(unittest.TestCase):
+    def test_one_template_for_every_delay(self):
+        scenario = saga.Scenario(saga.SALOON.description)
+        template = scenario.template()
+        for delay in (0, 20, server.MAX_DELAY):
+            stage = scenario.stage(delay)
+            self.assertEqual(stage.find('sheriff').delay, delay)
+            self.assertEqual(stage.max_steps, delay + saga.MAX_STEPS)
+            self.assertEqual([time for time, order, actor in stage.initiative.alarms], [delay])
+        self.assertIs(scenario.template(), template)
+
+    def test_plays_on_without_money_or_drinks(self):
+        cast = [dict(spec, props=[prop for prop in spec['props'] if prop[0] != 'money'])
+                for spec in saga.SALOON.description['cast']]
+        dry = saga.Scenario(dict(saga.SALOON.description, cast=cast, props=[]))
+        for scene in range(1, 31):
+            stage = play(dry, scene)
+            self.assertTrue(any(actor.escaped for actor in stage.actors), scene)
+
+    def test_props_can_go_by_other_names(self):
+        names = {'money': 'loot', 'glass': 'tumbler', 'bottle': 'decanter'}
+        cast = [dict(spec, props=[(names.get(name, name), cls, part) for name, cls, part in spec['props']])
+                for spec in saga.SALOON.description['cast']]
+        props = [dict(spec, name=names[spec['name']]) for spec in saga.SALOON.description['props']]
+        renamed = saga.Scenario(dict(saga.SALOON.description, cast=cast, props=props, handles=names))
+        original = {new: old for old, new in names.items()}
+        for scene in range(1, 11):
+            sink, expected = Events(), Events()
+            play(renamed, scene, sink=sink)
+            play(saga.SALOON, scene, sink=expected)
+            self.assertEqual([event._replace(objects=tuple(original.get(obj, obj) for obj in event.objects))
+                              for event in sink.events], expected.events)
+
+class EnsembleTest(unittest.TestCase):
+    def test_posse_scenes_end_in_an_escape(self):
+        for scene in range(1, 4):
+            stage = play(bench.POSSE, scene)
+            self.assertTrue(any(actor.escaped for actor in stage.actors), scene)
+
+    def test_nobody_shoots_the_dead(self):
+        for scene in range(1, 4):
+            sink = Events()
+            play(bench.POSSE, scene, sink=sink)
+            dead = set()
+            for event in sink.events:
+                if event.verb in ('fire', 'shot'):
+                    self.assertNotIn(event.objects[0], dead, (scene, event))
+                elif event.verb == 'dies':
+                    dead.add(event.objects[0])
+
+    def test_armed_cast_without_factions_fight_for_themselves(self):
+        cast = [{key: value for key, value in spec.items() if key != 'faction'}
+                for spec in saga.SALOON.description['cast']]
+        loners = saga.Scenario(dict(saga.SALOON.description, cast=cast))
+        for scene in range(1, 11):
+            sink, expected = Events(), Events()
+            stage = play(loners, scene, sink=sink)
+            play(saga.SALOON, scene, sink=expected)
+            self.assertTrue(any(actor.escaped for actor in stage.actors), scene)
+            self.assertEqual(sink.events, expected.events)
+
+    def test_money_can_be_taken_off_the_dead(self):
+        stage = saga.SALOON.stage(saga.DEFAULT_SHERIFF_DELAY, rng=saga.scene_rng(7, 1))
+        robber, sheriff = stage.find('robber'), stage.find('sheriff')
+        robber.move_to(stage.find('window'))
+        robber.health = 0
+        stage.casualty(robber)
+        saga.loop(stage)
+        self.assertTrue(sheriff.escaped)
+        self.assertIs(sheriff.get_if_held(stage.find('money')), stage.find('money'))
+
+    def test_targets_come_from_the_same_room(self):
+        stage = saga.SALOON_MAP.stage(saga.DEFAULT_SHERIFF_DELAY)
+        robber, sheriff = stage.find('robber'), stage.find('sheriff')
+        robber.move_to(stage.find('corner'))
+        sheriff.move_to(stage.find('table'))
+        self.assertIsNone(stage.hostile_to(sheriff))
+        robber.move_to(stage.find('table'))
+        self.assertIs(stage.hostile_to(sheriff), robber)
+        self.assertIs(stage.hostile_to(robber), sheriff)
+
+class ForkTest(unittest.TestCase):
+    def setUp(self):
+        self.out = io.StringIO()
+        self.stage = saga.SALOON.stage(saga.DEFAULT_SHERIFF_DELAY, sink=saga.ScreenplayRenderer(self.out),
+                                       rng=saga.scene_rng(7, 3))
+        saga.loop(self.stage, lambda stage: stage.elapsed_time >= saga.DEFAULT_SHERIFF_DELAY + 5)
+        self.assertFalse(self.stage.finished)
+
+    def rest_of_scene(self):
+        mark = len(self.out.getvalue())
+        saga.play(self.stage)
+        return self.out.getvalue()[mark:]
+
+    def test_fork_plays_on_the_same(self):
+        out = io.StringIO()
+        fork = self.stage.fork(saga.ScreenplayRenderer(out))
+        rest = self.rest_of_scene()
+        saga.play(fork)
+        self.assertEqual(out.getvalue(), rest)
+
+    def test_snapshot_forks_play_on_the_same(self):
+        snapshot = self.stage.snapshot()
+        rest = self.rest_of_scene()
+        for _ in range(3):
+            out = io.StringIO()
+            saga.play(snapshot.fork(saga.ScreenplayRenderer(out)))
+            self.assertEqual(out.getvalue(), rest)
+
+    def test_forks_share_fixtures_only(self):
+        fork = self.stage.fork()
+        for name in ('table', "robber's right hand", 'holster'):
+            self.assertIs(fork.find(name), self.stage.find(name))
+            self.assertIsNone(fork.find(name).stage)  # Belongs to neither
+        for name in ('robber', 'door', 'gun', 'money'):
+            self.assertIsNot(fork.find(name), self.stage.find(name))
+            self.assertIs(fork.find(name).stage, fork)
+
+    def test_no_more_play_after_the_curtain(self):
+        self.rest_of_scene()
+        sink = Events()
+        self.stage.sink = sink
+        elapsed = self.stage.elapsed_time
+        self.assertTrue(saga.play(self.stage))
+        self.assertEqual(sink.events, [])
+        self.assertEqual(self.stage.elapsed_time, elapsed)
+
+class ParallelTest(unittest.TestCase):
+    def test_parallel_novel_is_the_same_as_serial(self):
+        serial = list(saga.generate_novel(master_seed=7, num_scenes=40))
+        self.assertEqual(list(saga.generate_novel(master_seed=7, num_scenes=40, workers=2)), serial)
+
+    def test_parallel_stops_at_the_same_word_count(self):
+        serial = list(saga.generate_scenes(master_seed=7, target_words=3000))
+        self.assertEqual(list(saga.generate_scenes(master_seed=7, target_words=3000, workers=2)), serial)
+
+class MetricsTest(unittest.TestCase):
+    def test_counts_for_a_known_scene(self):
+        metrics = saga.Metrics()
+        sink = Events()
+        stage = saga.init(20, 3, sink, metrics, saga.scene_rng(7, 3))
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {'initiative evaluations': 62, 'retries': 9, 'scenes': 1, 'steps': 40})
+        counts = {branch: stats['count'] for branch, stats in snapshot['branches'].items()}
+        self.assertEqual(counts, {'check': 3, 'count': 1, 'die': 1, 'drink': 10, 'drop': 1, 'go': 7, 'lean': 1,
+                                  'queued command': 7, 'shoot': 7, 'stash money': 1, 'take money': 2, 'wander': 8})
+        # Every step is one attempt, plus one more for each retry
+        self.assertEqual(sum(counts.values()), stage.elapsed_time + snapshot['counters']['retries'])
+        self.assertEqual(counts['die'], sum(event.verb == 'dies' for event in sink.events))
+
+    def test_command_line_counts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.json')
+            subprocess.run([sys.executable, 'saga.py', '--delay', '20', '--seed', '7', '--scene', '3', '--format', 'none',
+                            '--metrics', path], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+            with open(path) as f:
+                written = json.load(f)
+        metrics = saga.Metrics()
+        saga.generate_scene(20, 3, 7, saga.NullRenderer, metrics)
+        expected = metrics.snapshot()
+        self.assertEqual(written['counters'], expected['counters'])
+        self.assertEqual({branch: stats['count'] for branch, stats in written['branches'].items()},
+                         {branch: stats['count'] for branch, stats in expected['branches'].items()})
+
+    def test_merged_snapshots_add_up_to_a_serial_run(self):
+        def counts(metrics):
+            snapshot = metrics.snapshot()
+            return snapshot['counters'], {branch: stats['count'] for branch, stats in snapshot['branches'].items()}
+
+        serial = saga.Metrics()
+        for scene in range(1, 21):
+            saga.generate_scene(20, scene, 7, saga.NullRenderer, serial)
+        merged = saga.Metrics()
+        for scene in range(1, 21):
+            one = saga.Metrics()
+            saga.generate_scene(20, scene, 7, saga.NullRenderer, one)
+            merged.merge(one.snapshot())
+        self.assertEqual(counts(merged), counts(serial))
+        parallel = saga.Metrics()
+        list(saga.generate_novel(20, 7, 20, workers=2, metrics=parallel))
+        self.assertEqual(counts(parallel), counts(serial))
+
+class WordsTest(unittest.TestCase):
+    def test_words_are_counted_the_same_in_every_format(self):
+        def scenes(renderer):
+            return len(list(saga.generate_scenes(master_seed=7, target_words=2000, renderer=renderer)))
+        expected = scenes(saga.ScreenplayRenderer)
+        for renderer in saga.RENDERERS.values():
+            self.assertEqual(scenes(renderer), expected, renderer)
+
+    def test_screenplay_words_match_the_text(self):
+        text = ''.join(saga.generate_scenes(master_seed=7, target_words=2000))
+        self.assertGreaterEqual(len(text.split()), 2000)
+
+def engine_shootout(drinks, seed):
+    """Play a shootout in the engine, from where shootout.py starts one: both actors in the room with
+    their guns and the money stashed. Returns whether the robber won and how many steps it took."""
+    stage = saga.SALOON.stage(0, rng=saga.scene_rng(seed, drinks))
+    robber, sheriff = stage.find('robber'), stage.find('sheriff')
+    robber.move_to(stage.find('table'))
+    sheriff.move_to(stage.find('table'))
+    stage.find('money').move_to(stage.find('corner'))
+    robber.path = ()
+    robber.inebriation = drinks
+    for actor in stage.actors:
+        actor.resolve()
+    stage.next_actor = saga.check_initiative(stage)
+    saga.play(stage, lambda stage: not (robber.is_alive and sheriff.is_alive))
+    return robber.is_alive, stage.elapsed_time
+
+class ShootoutTest(unittest.TestCase):
+    def test_outcomes_match_the_engine(self):
+        for drinks in (0, 3):
+            results = [engine_shootout(drinks, seed) for seed in range(2000)]
+            robber_wins = sum(won for won, steps in results) / len(results)
+            duration = sum(steps for won, steps in results) / len(results)
+            outcomes = shootout.simulate(50000, drinks, seed=1).distribution()
+            self.assertAlmostEqual(outcomes['winner']['robber'], robber_wins, delta=0.025)
+            self.assertAlmostEqual(outcomes['duration']['mean'], duration, delta=0.5)
+
+    def test_runs_can_differ(self):
+        outcomes = shootout.simulate(3, [0, 10, 20], seed=1)
+        self.assertEqual(len(outcomes.winner), 3)
+        self.assertNotIn(shootout.NOBODY, outcomes.winner)
+        self.assertEqual(outcomes.winner.tolist(), shootout.simulate(3, [0, 10, 20], seed=1).winner.tolist())
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'novel.txt')
+
+    def test_winners_are_kept_by_name(self):
+        with archive.ArchiveWriter(self.path, -1) as writer:
+            for scene, winner in enumerate(('bandit 65', None, 'deputy 2', 'bandit 65'), 1):
+                writer.write("Scene {}\n".format(scene), scene, 20, winner)
+        with archive.Archive(self.path) as novel:
+            self.assertEqual(novel.master_seed, -1)
+            self.assertEqual([novel.metadata(scene)['winner'] for scene in range(1, 5)],
+                             ['bandit 65', None, 'deputy 2', 'bandit 65'])
+            self.assertEqual(novel.scene(3), "Scene 3\n")
+
+    def test_novel_round_trip(self):
+        archive.write_novel(self.path, 20, 7, 12)
+        with archive.Archive(self.path) as novel:
+            self.assertEqual(len(novel), 12)
+            for scene in (1, 5, 12):
+                self.assertEqual(novel.scene(scene), saga.generate_scene(20, scene, 7))
+            self.assertEqual(novel.scenes(3, 8), ''.join(saga.generate_scene(20, scene, 7) for scene in range(3, 8)))
+
+    def test_scenes_found_by_number_whatever_order_they_were_written_in(self):
+        with archive.ArchiveWriter(self.path, 7) as writer:
+            for scene in (7, 5, 6):
+                writer.write("Scene {}\n".format(scene), scene, 20)
+            with self.assertRaises(ValueError):
+                writer.write("Again\n", 6, 20)
+        with archive.Archive(self.path) as novel:
+            self.assertEqual(len(novel), 7)
+            self.assertEqual(novel.scene(6), "Scene 6\n")
+            self.assertEqual(novel.metadata(7)['scene'], 7)
+            self.assertEqual(novel.scenes(5, 8), "Scene 5\nScene 6\nScene 7\n")
+            with self.assertRaises(IndexError):
+                novel.scene(4)
+
+    def test_bad_seed_leaves_no_files(self):
+        with self.assertRaises(ValueError):
+            archive.ArchiveWriter(self.path, 2 ** 64)
+        self.assertFalse(os.path.exists(self.path))
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'novel.log')
+        self.texts = list(replay.record(self.path, master_seed=7, num_scenes=20))
+
+    def test_recording_is_the_novel(self):
+        self.assertEqual(self.texts, list(saga.generate_novel(master_seed=7, num_scenes=20)))
+
+    def test_render_and_rerun_agree_with_the_recording(self):
+        self.assertEqual(list(replay.render(self.path)), self.texts)
+        self.assertEqual(list(replay.rerun(self.path)), self.texts)
+
+    def test_render_in_context(self):
+        teleplay = list(saga.generate_novel(master_seed=7, num_scenes=20, renderer=saga.TeleplayRenderer))
+        self.assertEqual(list(replay.render(self.path, saga.TeleplayRenderer)), teleplay)
+
+class ServerTest(unittest.TestCase):
+    def test_concurrent_clients_get_their_own_novels(self):
+        requests = [dict(seed=7, scenes=3), dict(seed=8, scenes=2), dict(seed=7, scenes=1, delay=40),
+                    dict(seed=9, words=500)]
+
+        async def fetch_all():
+            novelist = server.Server(2)
+            try:
+                listener = await novelist.start('127.0.0.1', 0)
+                port = listener.sockets[0].getsockname()[1]
+                async with listener:
+                    return await asyncio.gather(*(server.fetch('127.0.0.1', port, **params) for params in requests))
+            finally:
+                novelist.close()
+
+        for params, text in zip(requests, asyncio.run(fetch_all())):
+            delay = params.get('delay', saga.DEFAULT_SHERIFF_DELAY)
+            expected = saga.generate_scenes(delay, params['seed'], params.get('scenes'), params.get('words'))
+            self.assertEqual(text, ''.join(expected), params)
+
+    def test_bad_request_line(self):
+        async def request(line):
+            novelist = server.Server(1)
+            try:
+                listener = await novelist.start('127.0.0.1', 0)
+                async with listener:
+                    reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+                    writer.write(line)
+                    response = await reader.read()
+                    writer.close()
+                    return response
+            finally:
+                novelist.close()
+
+        self.assertTrue(asyncio.run(request(b'GET \r\n\r\n')).startswith(b'HTTP/1.1 400 Bad Request'))
+
+    def test_delay_is_bounded(self):
+        self.assertEqual(server.parse('delay={}'.format(server.MAX_DELAY))['delay'], server.MAX_DELAY)
+        for delay in (-1, server.MAX_DELAY + 1):
+            with self.assertRaises(ValueError):
+                server.parse('delay={}'.format(delay))
+
+if __name__ == '__main__':
+    unittest.main()